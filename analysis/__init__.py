@@ -0,0 +1,6 @@
+from .factor_data import ForwardReturnEngine, get_clean_factor_data, factor_data_to_frame
+from .ic import factor_information_coefficient, factors_information_coefficient
+from .report import ReportRunner
+from .correlation import factor_rank_correlation, mean_correlation, factor_ic_correlation, get_redundant_pairs
+from .turnover import quantile_turnover, factor_rank_autocorrelation, summary_turnover
+from .significance import ic_significance
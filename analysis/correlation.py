@@ -0,0 +1,171 @@
+"""
+因子间相关性分析
+因子堆叠为(因子, datetime, symbol)的数组后按日期分块，每块内所有因子对的横截面相关系数由批量矩阵乘法一次得到，
+计算量与因子数的平方成正比，但不需要逐对合并数据
+秩相关系数为Spearman相关系数，默认每期只在所有因子均有效的位置上排名，所有因子对使用同一样本，
+排名一次后由矩阵乘法得到；pairwise=True时每对因子在二者共同的有效位置上排名，与pandas两两剔除缺失值的
+corr(method="spearman")一致，有效位置不同的因子对需逐对重新排名，计算量随这样的因子对数增长
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from factor.cross_section import rank
+from analysis.ic import _row_corr
+
+
+def _sort_groups(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    每行排序，返回排序位置及排序后每个位置所在相同值组的首尾位置（NaN排在末尾，各自成组）
+    :return: (order, 组首位置, 组尾位置)，均为(行, 列)
+    """
+    n_rows, n_cols = matrix.shape
+    order = np.argsort(matrix, axis=1)
+    sorted_values = np.take_along_axis(matrix, order, axis=1)
+    position = np.arange(n_cols)
+
+    new_group = np.ones((n_rows, n_cols), dtype=bool)
+    new_group[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]
+    end_group = np.ones((n_rows, n_cols), dtype=bool)
+    end_group[:, :-1] = new_group[:, 1:]
+
+    first = np.maximum.accumulate(np.where(new_group, position, 0), axis=1)
+    last = np.minimum.accumulate(np.where(end_group, position, n_cols)[:, ::-1], axis=1)[:, ::-1]
+    return order, first, last
+
+
+def _subset_rank(order: np.ndarray, first: np.ndarray, last: np.ndarray, subset: np.ndarray) -> np.ndarray:
+    """
+    只在subset位置上的从1开始的平均排名（与pandas rank(method="average")一致），由_sort_groups的结果得到
+    subset之外的位置结果无意义
+    """
+    included = np.take_along_axis(subset, order, axis=1)
+    count = np.cumsum(included, axis=1)
+
+    # 相同值组内被包含的元素取组内首尾名次的均值
+    before = np.take_along_axis(count - included, first, axis=1)
+    through = np.take_along_axis(count, last, axis=1)
+    ranks = np.empty(order.shape)
+    np.put_along_axis(ranks, order, (before + 1 + through) / 2, axis=1)
+    return ranks
+
+
+def factor_rank_correlation(
+        matrices: Sequence[np.ndarray],
+        block_rows: Optional[int] = None,
+        pairwise: bool = False
+) -> np.ndarray:
+    """
+    每期横截面上所有因子两两之间的Spearman相关系数
+    :param matrices: 各因子行为日期、列为symbol的矩阵，形状相同；可以是磁盘上的memmap数组
+    :param block_rows: 每块的日期数；None时使每块约2^22个元素
+    :param pairwise: False时每期只使用所有因子均有效的位置，各因子在这些位置上排名一次；
+                     True时每对因子在二者共同的有效位置上排名：每个因子先在自身的有效值上排名，
+                     有效位置与共同位置不同的(日期, 因子对)再由排序结果在共同位置上重新排名（按批向量化）
+    :return: 形状为(datetime, 因子, 因子)的数组，有效值少于2个的位置为NaN
+    """
+    n_factors = len(matrices)
+    n_rows, n_cols = matrices[0].shape
+    if block_rows is None:
+        block_rows = max(1, 2 ** 22 // max(n_factors * n_cols, 1))
+
+    corr = np.full((n_rows, n_factors, n_factors), np.nan)
+    for row in range(0, n_rows, block_rows):
+        values = np.stack([np.asarray(matrix[row: row + block_rows], dtype="float64") for matrix in matrices])
+        n_block = values.shape[1]
+        valid = np.isfinite(values)
+        if not pairwise:
+            valid = np.broadcast_to(valid.all(axis=0), valid.shape)
+        values = np.where(valid, values, np.nan).reshape(n_factors * n_block, n_cols)
+
+        if pairwise:
+            order, first, last = _sort_groups(values)
+            ranks = _subset_rank(order, first, last, valid.reshape(n_factors * n_block, n_cols))
+        else:
+            ranks = rank(values, pct=False)
+        del values
+
+        # 排名减去均值，降低平方和的量级
+        count = valid.sum(axis=2)
+        ranks = ranks.reshape(n_factors, n_block, n_cols) - (count[:, :, None] + 1) / 2
+
+        # (日期, 因子, symbol)
+        mask = valid.transpose(1, 0, 2).astype("float64")
+        x = np.where(valid, ranks, 0).transpose(1, 0, 2)
+        del ranks
+
+        # 因子f与g共同有效位置上的个数、f的和与平方和、交叉项
+        n = np.matmul(mask, mask.transpose(0, 2, 1))
+        sx = np.matmul(x, mask.transpose(0, 2, 1))
+        sxx = np.matmul(x * x, mask.transpose(0, 2, 1))
+        sxy = np.matmul(x, x.transpose(0, 2, 1))
+        del mask, x
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = n * sxy - sx * sx.transpose(0, 2, 1)
+            var = n * sxx - sx * sx
+            block_corr = cov / np.sqrt(var * var.transpose(0, 2, 1))
+        block_corr[n < 2] = np.nan
+
+        if pairwise:
+            # 有效个数与共同个数相同时，自身的排名即为共同位置上的排名；否则在共同位置上重新排名
+            # 所有需要修正的(日期, f, g)汇总后按批计算，每批约2^22个元素
+            shape = (n_factors, n_block, n_cols)
+            order, first, last = order.reshape(shape), first.reshape(shape), last.reshape(shape)
+            own_count = count.T
+            f_idx, g_idx = np.triu_indices(n_factors, k=1)
+            common_count = n[:, f_idx, g_idx]
+            rows, pairs = np.nonzero((own_count[:, f_idx] != common_count) | (own_count[:, g_idx] != common_count))
+
+            batch = max(1, 2 ** 22 // n_cols)
+            for start in range(0, len(rows), batch):
+                r = rows[start: start + batch]
+                f, g = f_idx[pairs[start: start + batch]], g_idx[pairs[start: start + batch]]
+                common = valid[f, r] & valid[g, r]
+                ranks_f = _subset_rank(order[f, r], first[f, r], last[f, r], common)
+                ranks_g = _subset_rank(order[g, r], first[g, r], last[g, r], common)
+                block_corr[r, f, g] = block_corr[r, g, f] = _row_corr(ranks_f, ranks_g, common)
+
+        corr[row: row + n_block] = np.clip(block_corr, -1, 1)
+
+    return corr
+
+
+def mean_correlation(corr: np.ndarray, names: List[str]) -> DataFrame:
+    """逐期相关系数的时间序列均值"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        valid = ~np.isnan(corr)
+        mean = np.nansum(corr, axis=0) / valid.sum(axis=0)
+    return DataFrame(mean, index=names, columns=names)
+
+
+def factor_ic_correlation(ic_data: Dict[str, DataFrame]) -> Dict[str, DataFrame]:
+    """
+    各期因子IC时间序列之间的相关系数
+    :param ic_data: {因子名: factor_information_coefficient的结果}
+    :return: {期: 因子间IC相关系数矩阵}
+    """
+    names = list(ic_data.keys())
+    labels = list(ic_data[names[0]].columns)
+
+    # 所有因子的IC按日期对齐一次，每期直接计算相关系数矩阵
+    ic_df = pd.concat([ic_data[name] for name in names], axis=1, keys=names)
+    return {label: ic_df.xs(label, axis=1, level=1).corr() for label in labels}
+
+
+def get_redundant_pairs(corr_df: DataFrame, threshold: float = 0.8) -> DataFrame:
+    """相关系数绝对值不低于threshold的因子对，按绝对值降序排列"""
+    names = list(corr_df.index)
+    values = corr_df.to_numpy()
+    rows, cols = np.triu_indices(len(names), k=1)
+    selected = np.abs(values[rows, cols]) >= threshold
+    rows, cols = rows[selected], cols[selected]
+
+    pairs = DataFrame({
+        "factor_1": [names[i] for i in rows],
+        "factor_2": [names[j] for j in cols],
+        "correlation": values[rows, cols]
+    })
+    order = np.argsort(-np.abs(pairs["correlation"].to_numpy()), kind="stable")
+    return pairs.iloc[order].reset_index(drop=True)
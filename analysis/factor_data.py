@@ -0,0 +1,203 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from object import FactorData
+
+
+class MaxLossExceededError(Exception):
+    pass
+
+
+def quantize_factor(values: np.ndarray, valid: np.ndarray, quantiles: int = 5) -> np.ndarray:
+    """
+    每期横截面按分位数分组，与alphalens中pd.qcut(x, quantiles, labels=False) + 1的结果一致：
+    每行有效值排序一次，线性插值得到分位点，再按内部分位点计数得到组号；
+    分位点有重复的日期无法分组（alphalens中抛出异常后被忽略），整行组号为0
+    :return: int8数组，有效位置为1~quantiles，其余为0
+    """
+    n_rows, n_cols = values.shape
+    sorted_values = np.sort(np.where(valid, values, np.nan), axis=1)
+    count = valid.sum(axis=1)
+
+    # 与pandas Series.quantile一致：分位点以百分数传入numpy后再换算
+    q = np.linspace(0, 1, quantiles + 1) * 100 / 100
+    position = (np.maximum(count, 1) - 1)[:, None] * q[None, :]
+    lower = np.floor(position).astype("int64")
+    upper = np.minimum(lower + 1, np.maximum(count, 1)[:, None] - 1)
+    gamma = position - lower
+
+    a = np.take_along_axis(sorted_values, lower, axis=1)
+    b = np.take_along_axis(sorted_values, upper, axis=1)
+    diff = b - a
+    edges = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+
+    with np.errstate(invalid="ignore"):
+        unique_edges = (np.diff(edges, axis=1) > 0).all(axis=1) & (count > 0)
+
+    labels = np.ones((n_rows, n_cols), dtype="int8")
+    with np.errstate(invalid="ignore"):
+        for j in range(1, quantiles):
+            labels += values > edges[:, j: j + 1]
+
+    labels[~(valid & unique_edges[:, None])] = 0
+    return labels
+
+
+class ForwardReturnEngine:
+    """
+    远期收益率矩阵，每个Environment只计算一次，由所有因子共享
+    与alphalens中compute_forward_returns一致：价格先向前填充，第t期的k期收益率为p[t+k] / p[t] - 1；
+    偏离均值超过filter_zscore倍标准差的收益率视为缺失，均值与标准差按symbol在prices的全部日期上计算；
+    alphalens在因子日期层级（factor.index.levels[0]）与价格日期的交集上计算。环境中的因子与价格日期相同，
+    且宽表stack后、按日期切片后的层级仍保留全部日期，两者结果一致；只有日期层级被裁剪
+    （如remove_unused_levels）的因子，alphalens的过滤结果不同，这里仍使用全部日期，以便所有因子共享收益率
+    """
+
+    def __init__(
+            self,
+            prices: DataFrame,
+            periods: Sequence[int] = (1, 5, 10),
+            filter_zscore: Optional[float] = 20
+    ) -> None:
+        """:param prices: 行索引为datetime、列索引为symbol的成交价格"""
+        self.index = prices.index
+        self.columns = prices.columns
+        self.periods: List[int] = sorted(periods)
+        self.labels: List[str] = [f"{period}D" for period in self.periods]
+        self.filter_zscore: Optional[float] = filter_zscore
+
+        filled = prices.ffill().to_numpy(dtype="float64")
+        self.returns: Dict[str, np.ndarray] = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for period, label in zip(self.periods, self.labels):
+                returns = np.full_like(filled, np.nan)
+                returns[: len(filled) - period] = filled[period:] / filled[: len(filled) - period] - 1
+                self.returns[label] = returns
+
+            if filter_zscore is not None:
+                for label, returns in self.returns.items():
+                    count = (~np.isnan(returns)).sum(axis=0)
+                    mean = np.nansum(returns, axis=0) / count
+                    std = np.sqrt(np.nansum((returns - mean) ** 2, axis=0) / (count - 1))
+                    returns[np.abs(returns - mean) > filter_zscore * std] = np.nan
+
+        # 全部各期收益率均有效的位置；因子的有效位置是其子集
+        self.valid: np.ndarray = np.ones(filled.shape, dtype=bool)
+        for returns in self.returns.values():
+            self.valid &= np.isfinite(returns)
+
+        # 各期收益率的横截面排序结果，供rank IC等计算在所有因子间共享
+        self.sorted_returns: Dict[str, SortedReturns] = {}
+
+    def get_sorted_returns(self, label: str) -> "SortedReturns":
+        if label not in self.sorted_returns:
+            self.sorted_returns[label] = SortedReturns(self.returns[label], self.valid)
+        return self.sorted_returns[label]
+
+
+class SortedReturns:
+    """
+    一期收益率按日期排序的结果
+    flat_order：排序后每个位置对应的原矩阵展平下标（每行升序，NaN在后）
+    first/last：排序后每个位置所在相同值组在该行内的首尾位置
+    valid_rank：在engine.valid上的平均排名（按排序后的位置排列，无效位置为0）
+    """
+
+    def __init__(self, returns: np.ndarray, valid: np.ndarray) -> None:
+        n_rows, n_cols = returns.shape
+        index_dtype = "int32" if returns.size < 2 ** 31 else "int64"
+
+        order = np.argsort(returns, axis=1)
+        self.flat_order: np.ndarray = (order + (np.arange(n_rows) * n_cols)[:, None]).astype(index_dtype)
+        sorted_values = returns.ravel()[self.flat_order]
+
+        starts = np.ones(returns.shape, dtype=bool)
+        starts[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]
+        ends = np.ones(returns.shape, dtype=bool)
+        ends[:, :-1] = starts[:, 1:]
+        position = np.arange(n_cols, dtype="int32")
+        self.first: np.ndarray = np.maximum.accumulate(np.where(starts, position, 0), axis=1)
+        self.last: np.ndarray = np.minimum.accumulate(np.where(ends, position, n_cols)[:, ::-1], axis=1)[:, ::-1]
+
+        self.valid_sorted: np.ndarray = valid.ravel()[self.flat_order]
+        self.valid_rank: np.ndarray = self.get_rank(self.valid_sorted)
+
+    def get_rank(self, mask_sorted: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        只在mask内部计算平均排名，无需重新排序；结果按排序后的位置排列，mask之外为0
+        :param mask_sorted: 按排序后位置排列的mask，rows不为None时只包含这些行
+        :param rows: 只计算这些行，可以重复（如多个因子在同一日期的mask）
+        """
+        first, last = self.first, self.last
+        if rows is not None:
+            first, last = first[rows], last[rows]
+
+        count = np.cumsum(mask_sorted, axis=1)
+        before = count - mask_sorted
+
+        # 同组的值排名相同：取该组在mask内首尾排名的均值
+        group_rank = (np.take_along_axis(before, first, axis=1) + np.take_along_axis(count, last, axis=1) + 1) / 2
+        return np.where(mask_sorted, group_rank, 0)
+
+
+def get_clean_factor_data(
+        engine: ForwardReturnEngine,
+        factor_df: DataFrame,
+        quantiles: int = 5,
+        max_loss: float = 0.35
+) -> FactorData:
+    """
+    宽表版本的get_clean_factor_and_forward_returns：因子值与远期收益率均有限的位置参与分析，
+    并在其上按日期分组；丢弃比例超过max_loss时抛出MaxLossExceededError
+    :param factor_df: 行索引为datetime、列索引为symbol的因子值
+    """
+    factor = factor_df.reindex(index=engine.index, columns=engine.columns).to_numpy(dtype="float64")
+
+    present = ~np.isnan(factor)
+    forward_returns = engine.returns
+
+    # 与alphalens一致：先去掉非有限因子值与缺失的远期收益率再分组，最后再去掉无穷大的远期收益率
+    valid = np.isfinite(factor)
+    for returns in forward_returns.values():
+        valid &= ~np.isnan(returns)
+    fwdret_amount = valid.sum()
+
+    factor_quantile = quantize_factor(factor, valid, quantiles)
+    mask = factor_quantile > 0
+    for returns in forward_returns.values():
+        mask &= ~np.isinf(returns)
+
+    initial_amount = max(present.sum(), 1)
+    tot_loss = (initial_amount - (factor_quantile > 0).sum()) / initial_amount
+    if tot_loss > max_loss:
+        fwdret_loss = (initial_amount - fwdret_amount) / initial_amount
+        raise MaxLossExceededError(
+            f"丢弃的因子数据比例{tot_loss:.1%}超过max_loss {max_loss:.1%}"
+            f"（远期收益率{fwdret_loss:.1%}，分组{tot_loss - fwdret_loss:.1%}）"
+        )
+
+    return FactorData(engine.index, engine.columns, factor, factor_quantile, forward_returns, mask)
+
+
+def factor_data_to_frame(factor_data: FactorData) -> DataFrame:
+    """
+    转换为alphalens的factor_data格式：(date, asset)为索引，列为各期远期收益率、factor、factor_quantile；
+    仅在调用alphalens的函数时需要
+    """
+    from alphalens.utils import infer_trading_calendar
+
+    rows, cols = np.nonzero(factor_data.mask)
+    # 与alphalens一致，date层级保留全部日期（含没有有效数据的日期），交易日历才能设置为该层级的freq
+    index = pd.MultiIndex(
+        levels=[factor_data.index, factor_data.columns], codes=[rows, cols], names=["date", "asset"]
+    )
+
+    data = {label: returns[rows, cols] for label, returns in factor_data.forward_returns.items()}
+    data["factor"] = factor_data.factor[rows, cols]
+    data["factor_quantile"] = factor_data.factor_quantile[rows, cols].astype("int64")
+    frame = DataFrame(data, index=index)
+
+    frame.index.levels[0].freq = infer_trading_calendar(factor_data.index, factor_data.index)
+    return frame
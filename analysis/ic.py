@@ -0,0 +1,126 @@
+from typing import List, Optional
+import numpy as np
+from pandas import DataFrame
+
+from object import FactorData
+from factor.cross_section import rank
+from analysis.factor_data import ForwardReturnEngine
+
+
+def _rank_corr(x_rank: np.ndarray, y_rank: np.ndarray, x_square: np.ndarray, count: np.ndarray) -> np.ndarray:
+    """
+    每行平均排名的相关系数（mask之外的排名为0）；排名之和恒为n(n+1)/2，故只需计算交叉项与平方和
+    :param x_square: 每行x_rank的平方和
+    """
+    center = count * ((count + 1) / 2) ** 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = np.einsum("ij,ij->i", x_rank, y_rank) - center
+        var = (x_square - center) * (np.einsum("ij,ij->i", y_rank, y_rank) - center)
+        corr = cov / np.sqrt(var)
+    corr[count < 2] = np.nan
+    return corr
+
+
+def _row_corr(x: np.ndarray, y: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """每行在mask上的Pearson相关系数；有效值少于2个或方差为0时为NaN"""
+    count = mask.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x = np.where(mask, x, 0)
+        y = np.where(mask, y, 0)
+        dx = (x - (x.sum(axis=1) / count)[:, None]) * mask
+        dy = (y - (y.sum(axis=1) / count)[:, None]) * mask
+        var = np.einsum("ij,ij->i", dx, dx) * np.einsum("ij,ij->i", dy, dy)
+        corr = np.einsum("ij,ij->i", dx, dy) / np.sqrt(var)
+    corr[count < 2] = np.nan
+    return corr
+
+
+def factors_information_coefficient(
+        engine: ForwardReturnEngine,
+        factor_data_list: List[FactorData],
+        method: str = "spearman",
+        block_rows: Optional[int] = None
+) -> List[DataFrame]:
+    """
+    多个因子的各期IC，与逐个因子调用alphalens.performance.factor_information_coefficient的结果一致
+    因子堆叠为(因子, datetime, symbol)后按日期分块，每块内所有因子、所有期的IC由批量数组运算得到：
+    spearman：所有因子一次排名；收益率复用engine中的排序结果，有效位置与engine.valid相同的(因子, 日期)直接使用已有排名，
+    其余(因子, 日期)汇总后一次在各自的有效位置上重新计算平均排名，均无需重新排序
+    pearson：直接计算因子值与收益率的相关系数
+    :param block_rows: 每块的日期数；None时使每块约2^22个元素
+    :return: 与factor_data_list顺序一致，行索引为日期（该因子首个至最后一个有效日期之间的全部交易日），列为各期
+    """
+    if method not in ("spearman", "pearson"):
+        raise ValueError(f"不支持的IC计算方法：{method}")
+
+    n_factors = len(factor_data_list)
+    n_rows, n_cols = len(engine.index), len(engine.columns)
+    if block_rows is None:
+        block_rows = max(1, 2 ** 22 // max(n_factors * n_cols, 1))
+
+    ic = np.full((len(engine.labels), n_factors, n_rows), np.nan)
+    counts = np.zeros((n_factors, n_rows), dtype="int64")
+    for row in range(0, n_rows, block_rows):
+        block = slice(row, row + block_rows)
+        mask = np.stack([factor_data.mask[block] for factor_data in factor_data_list])
+        n_block = mask.shape[1]
+        count = mask.sum(axis=2)
+        counts[:, block] = count
+
+        if method == "spearman":
+            factors = np.stack([np.where(factor_data.mask[block], factor_data.factor[block], np.nan)
+                                for factor_data in factor_data_list])
+            factor_rank = np.nan_to_num(rank(factors.reshape(n_factors * n_block, n_cols), pct=False))
+            factor_rank = factor_rank.reshape(n_factors, n_block * n_cols)
+            factor_square = np.einsum("ij,ij->i", factor_rank.reshape(-1, n_cols), factor_rank.reshape(-1, n_cols))
+            del factors
+
+            # 有效位置与engine.valid不同的(因子, 日期)
+            rerank_factors, rerank_rows = np.nonzero((mask != engine.valid[block]).any(axis=2))
+            mask = mask.reshape(n_factors, n_block * n_cols)
+
+            for i, label in enumerate(engine.labels):
+                sorted_returns = engine.get_sorted_returns(label)
+                # 块内展平下标
+                order = sorted_returns.flat_order[block] - row * n_cols
+
+                returns_rank = np.repeat(sorted_returns.valid_rank[None, block], n_factors, axis=0)
+                if len(rerank_rows):
+                    mask_sorted = mask[rerank_factors[:, None], order[rerank_rows]]
+                    returns_rank[rerank_factors, rerank_rows] = sorted_returns.get_rank(mask_sorted, rerank_rows + row)
+
+                factor_sorted = factor_rank[:, order.ravel()].reshape(-1, n_cols)
+                ic[i, :, block] = _rank_corr(
+                    factor_sorted, returns_rank.reshape(-1, n_cols), factor_square, count.ravel()
+                ).reshape(n_factors, n_block)
+        else:
+            factors = np.stack([factor_data.factor[block] for factor_data in factor_data_list])
+            for i, label in enumerate(engine.labels):
+                returns = np.broadcast_to(engine.returns[label][block], factors.shape)
+                ic[i, :, block] = _row_corr(
+                    factors.reshape(-1, n_cols), returns.reshape(-1, n_cols), mask.reshape(-1, n_cols)
+                ).reshape(n_factors, n_block)
+
+    ic_list = []
+    for j, factor_data in enumerate(factor_data_list):
+        rows = np.flatnonzero(counts[j] > 0)
+        if len(rows) == 0:
+            ic_list.append(DataFrame(columns=engine.labels))
+            continue
+
+        ic_df = DataFrame(ic[:, j].T, index=factor_data.index, columns=engine.labels).iloc[rows[0]: rows[-1] + 1]
+        ic_df.index.name = "date"
+        ic_list.append(ic_df)
+    return ic_list
+
+
+def factor_information_coefficient(
+        engine: ForwardReturnEngine,
+        factor_data: FactorData,
+        method: str = "spearman"
+) -> DataFrame:
+    """
+    因子各期IC，与alphalens.performance.factor_information_coefficient的结果一致
+    :return: 行索引为日期（首个至最后一个有效日期之间的全部交易日），列为各期
+    """
+    return factors_information_coefficient(engine, [factor_data], method)[0]
@@ -0,0 +1,335 @@
+import hashlib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from tqdm import tqdm
+
+from analysis.factor_data import get_clean_factor_data, factor_data_to_frame
+from analysis.ic import factor_information_coefficient
+from analysis.turnover import summary_turnover
+from analysis.significance import ic_significance
+from analysis.correlation import factor_rank_correlation, mean_correlation, factor_ic_correlation, get_redundant_pairs
+from log.logger import Logger
+
+
+def atomic_write(path: Path, writer: Callable[[Path], None]) -> None:
+    """先写入同目录下的临时文件再替换，中断时不会留下不完整的结果"""
+    tmp_path = path.with_name(f"{path.stem}.tmp{path.suffix}")
+    writer(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _init_render_worker() -> None:
+    # 子进程没有图形界面，使用非交互式后端
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render_return(return_stats: Dict[str, DataFrame], save_path: Path) -> None:
+    from utilities import render_return
+
+    atomic_write(save_path, lambda tmp_path: render_return(return_stats, save_pic=True, save_path=tmp_path))
+
+
+class ReportRunner:
+    """
+    因子分析报告
+    每个因子的输出（ic_{因子}.csv、turnover_{因子}.csv、各收益率表格及retrun_{因子}.png）记录在报告目录的manifest.json中，
+    并附带由因子定义、bar数据及periods生成的指纹；重新运行时指纹一致且输出文件完整的因子直接跳过
+    并行只用于因子计算与画图：统计量（IC、换手率、回报率）在主进程中逐个因子串行计算并保存为表格，
+    画图作为单独的阶段分发到进程池（processes大于1时），也可以完全跳过；画图均使用非交互式后端（Agg）
+    """
+
+    manifest_name: str = "manifest.json"
+    return_tables: Tuple[str, ...] = ("quantile", "factor", "spread")
+    correlation_key: str = "__correlation__"
+    significance_key: str = "__significance__"
+
+    def __init__(
+            self,
+            environment,
+            folder_dir: Path,
+            periods: Sequence[int] = (1, 5, 10),
+            processes: Optional[int] = None,
+            render: bool = True
+    ) -> None:
+        """:param render: 为False时只计算并保存统计表格，不画图"""
+        self.environment = environment
+        self.folder_dir: Path = Path(folder_dir)
+        self.periods: List[int] = list(periods)
+        self.processes: Optional[int] = processes
+        self.render: bool = render
+
+        self.manifest_path: Path = self.folder_dir.joinpath(self.manifest_name)
+        self.manifest: Dict[str, dict] = {}
+        self.ic_data: Dict[str, DataFrame] = {}     # 各因子IC序列，供跨因子的分析使用
+        self.logger: Logger = Logger("ReportRunner")
+
+    def get_fingerprint(self, factor) -> str:
+        cache = self.environment.bar_data_cache
+        content = json.dumps({
+            "factor_key": self.environment.get_factor_key(factor),
+            "start": cache.start,
+            "end": cache.end,
+            "periods": self.periods
+        }, sort_keys=True, default=str)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def get_outputs(self, factor) -> List[str]:
+        outputs = [f"ic_{factor.name}.csv", f"ic_series_{factor.name}.pkl", f"turnover_{factor.name}.csv"]
+        outputs += [f"{table}_return_{factor.name}.csv" for table in self.return_tables]
+        if self.render:
+            outputs.append(f"retrun_{factor.name}.png")
+        return outputs
+
+    def load_manifest(self) -> None:
+        if self.manifest_path.exists():
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    def save_manifest(self) -> None:
+        def _write(tmp_path: Path) -> None:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+        atomic_write(self.manifest_path, _write)
+
+    def is_up_to_date(self, key: str, fingerprint: str, outputs: List[str]) -> bool:
+        record = self.manifest.get(key)
+        if record is None or record["fingerprint"] != fingerprint:
+            return False
+        return all(self.folder_dir.joinpath(name).exists() for name in outputs)
+
+    def record(self, key: str, fingerprint: str, outputs: List[str]) -> None:
+        self.manifest[key] = {"fingerprint": fingerprint, "outputs": outputs}
+        self.save_manifest()
+
+    def write_ic(self, factor, factor_data) -> None:
+        from utilities import summary_ic_data
+
+        engine = self.environment.get_forward_return_engine(self.periods)
+        ic_data = factor_information_coefficient(engine, factor_data)
+        self.ic_data[factor.name] = ic_data
+        sum_df = summary_ic_data(ic_data)
+        sum_df.index = [f"{i}d" for i in self.periods]
+        sum_df = sum_df.T
+
+        atomic_write(self.folder_dir.joinpath(f"ic_{factor.name}.csv"), sum_df.to_csv)
+        # IC序列供跨因子的分析使用，跳过的因子直接读取
+        atomic_write(self.folder_dir.joinpath(f"ic_series_{factor.name}.pkl"), ic_data.to_pickle)
+
+    def write_turnover(self, factor, factor_data) -> None:
+        turnover_df = summary_turnover(factor_data, self.periods)
+        atomic_write(self.folder_dir.joinpath(f"turnover_{factor.name}.csv"), turnover_df.to_csv)
+
+    def write_return(self, factor, factor_data) -> Dict[str, DataFrame]:
+        """计算并保存回报率分析的统计表格；返回画图所需的全部统计量"""
+        from utilities import compute_return_stats, summary_return_stats
+
+        return_stats = compute_return_stats(factor_data_to_frame(factor_data))
+        for table, table_df in summary_return_stats(return_stats).items():
+            atomic_write(self.folder_dir.joinpath(f"{table}_return_{factor.name}.csv"), table_df.to_csv)
+        return return_stats
+
+    def use_pool(self) -> bool:
+        return self.processes is not None and self.processes > 1
+
+    def run(self) -> None:
+        self.folder_dir.mkdir(parents=True, exist_ok=True)
+        self.load_manifest()
+
+        stale: List[Tuple[object, str]] = []
+        for factor in self.environment.factors:
+            fingerprint = self.get_fingerprint(factor)
+            if not self.is_up_to_date(factor.name, fingerprint, self.get_outputs(factor)):
+                stale.append((factor, fingerprint))
+
+        self.logger.info(f"共{len(self.environment.factors)}个因子，{len(stale)}个需要重新分析")
+        if not stale:
+            return
+
+        # 需要分析的因子一次计算：有表达式的因子在同一张计算图上求值，其余因子在进程池或当前进程中计算
+        use_pool = self.use_pool()
+        self.environment.calculate_factors(self.processes if use_pool else 1, [factor for factor, _ in stale])
+
+        # 远期收益率对所有因子只计算一次
+        engine = self.environment.get_forward_return_engine(self.periods)
+
+        executor = None
+        backend = None
+        if use_pool and self.render:
+            executor = ProcessPoolExecutor(self.processes, initializer=_init_render_worker)
+        elif self.render:
+            # 在当前进程中画图时同样只保存到文件，使用非交互式后端，结束后恢复原后端
+            import matplotlib
+            backend = matplotlib.get_backend()
+            matplotlib.use("Agg")
+        futures: Dict[Future, Tuple[object, str]] = {}
+
+        def _collect(done) -> None:
+            for future in done:
+                factor, fingerprint = futures.pop(future)
+                future.result()
+                self.record(factor.name, fingerprint, self.get_outputs(factor))
+
+        try:
+            iters = tqdm(stale)
+            for factor, fingerprint in iters:
+                iters.set_description(f"正在分析{factor.name}")
+                # 已去除na、inf
+                factor_data = get_clean_factor_data(engine, self.environment.get_factor_matrix(factor))
+
+                # ic分析
+                self.write_ic(factor, factor_data)
+
+                # 换手率分析
+                self.write_turnover(factor, factor_data)
+
+                # 回报率分析；子进程只接收统计表格，不需要因子数据
+                return_stats = self.write_return(factor, factor_data)
+                del factor_data
+
+                save_path = self.folder_dir.joinpath(f"retrun_{factor.name}.png")
+                if executor is None:
+                    if self.render:
+                        _render_return(return_stats, save_path)
+                    self.record(factor.name, fingerprint, self.get_outputs(factor))
+                    continue
+
+                # 限制排队中的任务数，避免同时持有过多因子的数据
+                if len(futures) >= 2 * self.processes:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    _collect(done)
+                futures[executor.submit(_render_return, return_stats, save_path)] = (factor, fingerprint)
+
+            if futures:
+                done, _ = wait(futures)
+                _collect(done)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if backend is not None:
+                import matplotlib
+                matplotlib.use(backend)
+
+    def get_factors_fingerprint(self, factors: list, **kwargs) -> str:
+        """由全部因子的指纹及分析参数生成的指纹，用于跨因子的分析"""
+        content = json.dumps({
+            "factors": [[factor.name, self.get_fingerprint(factor)] for factor in factors],
+            **kwargs
+        }, sort_keys=True)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def get_ic_data(self, factors: list) -> Dict[str, DataFrame]:
+        """各因子的IC；本次跳过的因子读取已保存的IC序列，只有缺失时才重新计算"""
+        missing = []
+        for factor in factors:
+            if factor.name in self.ic_data:
+                continue
+
+            if self.is_up_to_date(factor.name, self.get_fingerprint(factor), self.get_outputs(factor)):
+                ic_path = self.folder_dir.joinpath(f"ic_series_{factor.name}.pkl")
+                self.ic_data[factor.name] = pd.read_pickle(ic_path)
+            else:
+                missing.append(factor)
+
+        if missing:
+            self.environment.calculate_factors(self.processes if self.use_pool() else 1, missing)
+            engine = self.environment.get_forward_return_engine(self.periods)
+            for factor in missing:
+                factor_data = get_clean_factor_data(engine, self.environment.get_factor_matrix(factor))
+                self.ic_data[factor.name] = factor_information_coefficient(engine, factor_data)
+
+        return {factor.name: self.ic_data[factor.name] for factor in factors}
+
+    def run_significance(
+            self,
+            n_resamples: int = 2000,
+            block_size: Optional[int] = None,
+            alpha: float = 0.05,
+            seed: int = 0
+    ) -> None:
+        """
+        所有因子IC均值与IR的块自助法置信区间及符号翻转置换检验p值，保存为ic_significance.csv；
+        任一因子变化时重新计算
+        :param block_size: 所有期共用的块长度；None时每期取max(期数, 日期数的立方根)
+        """
+        factors = self.environment.factors
+        if not factors:
+            return
+
+        self.folder_dir.mkdir(parents=True, exist_ok=True)
+        self.load_manifest()
+        fingerprint = self.get_factors_fingerprint(
+            factors, n_resamples=n_resamples, block_size=block_size, alpha=alpha, seed=seed
+        )
+        outputs = ["ic_significance.csv"]
+        if self.is_up_to_date(self.significance_key, fingerprint, outputs):
+            return
+
+        engine = self.environment.get_forward_return_engine(self.periods)
+
+        # 按完整的日期轴对齐，每个因子的结果与同时检验的其他因子无关
+        significance_df = ic_significance(
+            self.get_ic_data(factors), engine.index, n_resamples, block_size, alpha, seed
+        )
+        atomic_write(self.folder_dir.joinpath("ic_significance.csv"), significance_df.to_csv)
+        self.record(self.significance_key, fingerprint, outputs)
+
+    def get_correlation_outputs(self) -> List[str]:
+        labels = [f"{period}d" for period in sorted(self.periods)]
+        return ["factor_correlation.csv", "redundant_factors.csv"] + [f"ic_correlation_{label}.csv" for label in labels]
+
+    def get_factor_matrices(self, factors: list) -> List[np.ndarray]:
+        """各因子按第一个因子的行列对齐后的矩阵；已对齐时不复制（磁盘上的因子仍按块读取）"""
+        # 未计算的因子一次计算，表达式因子共用计算图
+        self.environment.calculate_factors(self.processes if self.use_pool() else 1, factors)
+        matrices = []
+        index = columns = None
+        for factor in factors:
+            factor_df = self.environment.get_factor_matrix(factor)
+            if index is None:
+                index, columns = factor_df.index, factor_df.columns
+            elif not (factor_df.index.equals(index) and factor_df.columns.equals(columns)):
+                factor_df = factor_df.reindex(index=index, columns=columns)
+            matrices.append(factor_df.to_numpy())
+        return matrices
+
+    def run_correlation(self, threshold: float = 0.8, pairwise: bool = False) -> None:
+        """
+        因子间相关性分析：逐期横截面Spearman相关系数的时间均值、各期因子IC之间的相关系数，
+        以及相关系数绝对值不低于threshold的因子对；任一因子变化时重新计算
+        IC序列从报告目录读取；秩相关系数需要全部因子值，设置了因子缓存时跳过的因子从缓存读取
+        :param pairwise: False时每期只在所有因子均有效的位置上排名（所有因子对使用同一样本）；
+                         True时每对因子在二者共同的有效位置上排名，结果与pandas的两两Spearman相关系数一致，但计算较慢
+        """
+        factors = self.environment.factors
+        if len(factors) < 2:
+            return
+
+        self.folder_dir.mkdir(parents=True, exist_ok=True)
+        self.load_manifest()
+        fingerprint = self.get_factors_fingerprint(factors, threshold=threshold, pairwise=pairwise)
+        outputs = self.get_correlation_outputs()
+        if self.is_up_to_date(self.correlation_key, fingerprint, outputs):
+            return
+
+        names = [factor.name for factor in factors]
+        ic_data = self.get_ic_data(factors)
+        corr_df = mean_correlation(factor_rank_correlation(self.get_factor_matrices(factors), pairwise=pairwise), names)
+        atomic_write(self.folder_dir.joinpath("factor_correlation.csv"), corr_df.to_csv)
+        atomic_write(
+            self.folder_dir.joinpath("redundant_factors.csv"),
+            lambda tmp_path: get_redundant_pairs(corr_df, threshold).to_csv(tmp_path, index=False)
+        )
+
+        ic_corr = factor_ic_correlation(ic_data)
+        for label, ic_corr_df in ic_corr.items():
+            atomic_write(self.folder_dir.joinpath(f"ic_correlation_{label.lower()}.csv"), ic_corr_df.to_csv)
+
+        self.record(self.correlation_key, fingerprint, outputs)
@@ -0,0 +1,174 @@
+"""
+IC均值与IR的显著性检验
+5d、10d等多期IC由重叠的远期收益率计算，存在自相关，t检验会高估显著性；此处按日期分块重抽样：
+块自助法（circular block bootstrap）给出置信区间，按块随机翻转符号的置换检验给出p值
+每次重抽样表示为各日期的权重（被抽中的次数或±1），所有因子、所有期的统计量由一次矩阵乘法得到
+"""
+from typing import Dict, List, Optional, Tuple
+import warnings
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, DatetimeIndex
+
+
+def _moments(weights: np.ndarray, values: np.ndarray, valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    每组权重下各列的均值与IR（均值/样本标准差）
+    :param weights: (重抽样次数, 日期)；为负时表示翻转符号，样本个数与平方和按绝对值计算
+    :param values: (日期, 列)，缺失值已填0
+    :param valid: (日期, 列)，非缺失为1
+    """
+    abs_weights = np.abs(weights)
+    count = abs_weights @ valid
+    total = weights @ values
+    square = abs_weights @ (values * values)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        std = np.sqrt(np.maximum(square - count * mean * mean, 0) / (count - 1))
+        return mean, mean / std
+
+
+def block_bootstrap_weights(rng: np.random.Generator, n: int, block_size: int, n_resamples: int) -> np.ndarray:
+    """
+    circular block bootstrap：随机选取起点，首尾相接地取长度为block_size的连续日期，拼接至n个
+    :return: (n_resamples, n)，每个日期在各次重抽样中被抽中的次数
+    """
+    n_blocks = -(-n // block_size)
+    starts = rng.integers(0, n, size=(n_resamples, n_blocks))
+    index = ((starts[:, :, None] + np.arange(block_size)) % n).reshape(n_resamples, -1)[:, :n]
+    flat = (index + (np.arange(n_resamples) * n)[:, None]).ravel()
+    return np.bincount(flat, minlength=n_resamples * n).reshape(n_resamples, n).astype("float64")
+
+
+def block_sign_flips(rng: np.random.Generator, n: int, block_size: int, n_resamples: int) -> np.ndarray:
+    """
+    按块翻转符号：连续block_size个日期共用一个随机符号，保留块内的自相关
+    :return: (n_resamples, n)，元素为±1
+    """
+    n_blocks = -(-n // block_size)
+    signs = rng.choice(np.array([-1.0, 1.0]), size=(n_resamples, n_blocks))
+    return signs[:, np.arange(n) // block_size]
+
+
+def _resample_stats(
+        values: np.ndarray,
+        valid: np.ndarray,
+        block_size: int,
+        n_resamples: int,
+        rng: np.random.Generator
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    一组列在同一块长度下的重抽样
+    :return: (自助法均值, 自助法IR, 置换检验中均值绝对值不小于观测值的次数, IR的次数)
+    """
+    n = len(values)
+    observed_mean, observed_ir = _moments(np.ones((1, n)), values, valid)
+
+    chunk = max(1, 2 ** 22 // max(n, 1))
+    boot_mean, boot_ir = [], []
+    exceed_mean = np.zeros(values.shape[1])
+    exceed_ir = np.zeros(values.shape[1])
+    for start in range(0, n_resamples, chunk):
+        size = min(chunk, n_resamples - start)
+
+        mean, ir = _moments(block_bootstrap_weights(rng, n, block_size, size), values, valid)
+        boot_mean.append(mean)
+        boot_ir.append(ir)
+
+        # 原假设下IC关于0对称，翻转符号后的统计量不小于观测值（绝对值）的比例即为p值
+        mean, ir = _moments(block_sign_flips(rng, n, block_size, size), values, valid)
+        with np.errstate(invalid="ignore"):
+            exceed_mean += (np.abs(mean) >= np.abs(observed_mean)).sum(axis=0)
+            exceed_ir += (np.abs(ir) >= np.abs(observed_ir)).sum(axis=0)
+
+    return np.concatenate(boot_mean), np.concatenate(boot_ir), exceed_mean, exceed_ir
+
+
+def ic_significance(
+        ic_data: Dict[str, DataFrame],
+        index: Optional[DatetimeIndex] = None,
+        n_resamples: int = 2000,
+        block_size: Optional[int] = None,
+        alpha: float = 0.05,
+        seed: int = 0,
+        min_blocks: int = 10
+) -> DataFrame:
+    """
+    所有因子、所有期IC均值与IR的块自助法置信区间及符号翻转置换检验的双侧p值
+    同一期的所有因子共用同一组重抽样，结果只取决于日期轴、块长度与随机数种子，与同时检验的因子无关
+    :param ic_data: {因子名: factor_information_coefficient的结果}，列名为"1D"、"5D"等
+    :param index: 对齐的日期轴；None时为所有IC日期的并集
+    :param block_size: 所有期共用的块长度（日期数）；None时每期取max(期数, 日期数的立方根)，
+                       块长度不小于重叠收益率造成的自相关长度
+    :param min_blocks: 有效IC个数不足min_blocks个块时重抽样的结果不可靠，置信区间与p值为NaN并给出警告
+    :return: 行索引为(因子, 统计量)，列为各期
+    """
+    names = list(ic_data.keys())
+    labels: List[str] = list(ic_data[names[0]].columns)
+    ic_df = pd.concat([ic_data[name] for name in names], axis=1, keys=names)
+    if index is not None:
+        ic_df = ic_df.reindex(index)
+
+    values = ic_df.to_numpy(dtype="float64")
+    valid = (~np.isnan(values)).astype("float64")
+    values = np.nan_to_num(values)
+    n, n_columns = values.shape
+
+    observed_mean, observed_ir = _moments(np.ones((1, n)), values, valid)
+    observed_mean, observed_ir = observed_mean[0], observed_ir[0]
+
+    boot_mean = np.full((n_resamples, n_columns), np.nan)
+    boot_ir = np.full((n_resamples, n_columns), np.nan)
+    exceed_mean = np.full(n_columns, np.nan)
+    exceed_ir = np.full(n_columns, np.nan)
+
+    # 各期按块长度分组，每组的所有列一次重抽样；随机数种子由块长度确定，与其他期无关
+    column_labels = ic_df.columns.get_level_values(1)
+    label_block_size = {}
+    for label in labels:
+        size = block_size if block_size is not None else max(int(label[:-1]), int(np.ceil(n ** (1 / 3))))
+        label_block_size[label] = max(1, min(size, n))
+
+    for size in sorted(set(label_block_size.values())):
+        columns = np.flatnonzero(column_labels.isin([label for label, s in label_block_size.items() if s == size]))
+        rng = np.random.default_rng([seed, size])
+        results = _resample_stats(values[:, columns], valid[:, columns], size, n_resamples, rng)
+        boot_mean[:, columns], boot_ir[:, columns], exceed_mean[columns], exceed_ir[columns] = results
+
+    # 块数过少时，重抽样只有很少的不同结果
+    column_block_size = np.array([label_block_size[label] for label in column_labels])
+    too_few = valid.sum(axis=0) / column_block_size < min_blocks
+    if too_few.any():
+        warnings.warn(
+            f"{too_few.sum()}列IC的有效个数不足{min_blocks}个块，置信区间与p值设为NaN：" +
+            "、".join(f"{name}({label})" for name, label in ic_df.columns[too_few])
+        )
+    boot_mean[:, too_few] = np.nan
+    boot_ir[:, too_few] = np.nan
+
+    quantiles = [alpha / 2, 1 - alpha / 2]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)     # 全为NaN的列
+        mean_lower, mean_upper = np.nanquantile(boot_mean, quantiles, axis=0)
+        ir_lower, ir_upper = np.nanquantile(boot_ir, quantiles, axis=0)
+
+    p_mean = np.where(np.isnan(observed_mean) | too_few, np.nan, (exceed_mean + 1) / (n_resamples + 1))
+    p_ir = np.where(np.isnan(observed_ir) | too_few, np.nan, (exceed_ir + 1) / (n_resamples + 1))
+    stats = {
+        "IC Mean": observed_mean,
+        "IC Mean CI Lower": mean_lower,
+        "IC Mean CI Upper": mean_upper,
+        "p-value(IC Mean)": p_mean,
+        "Information Ratio": observed_ir,
+        "IR CI Lower": ir_lower,
+        "IR CI Upper": ir_upper,
+        "p-value(IR)": p_ir,
+    }
+
+    # 列为(因子, 期)，整理为行(因子, 统计量)、列为期
+    stats_df = DataFrame(stats, index=ic_df.columns)
+    stats_df.columns.name = "statistic"
+    result = stats_df.stack().unstack(level=1)[labels]
+    result = result.reindex(pd.MultiIndex.from_product([names, list(stats.keys())], names=["factor", "statistic"]))
+    result.columns = [label.lower() for label in labels]
+    return result
@@ -0,0 +1,88 @@
+"""
+换手率与因子自相关分析
+在宽表的分组标签与排名矩阵上按日期向量化计算，与alphalens.performance中quantile_turnover、
+factor_rank_autocorrelation的结果一致；日期间隔按交易日位置计算，相隔的交易日无数据时结果为NaN
+"""
+from typing import Sequence
+import numpy as np
+from pandas import DataFrame
+
+from object import FactorData
+from factor.cross_section import rank
+from analysis.ic import _row_corr
+
+
+def _valid_rows(present: np.ndarray) -> slice:
+    """首个至最后一个有数据的日期"""
+    rows = np.flatnonzero(present)
+    if len(rows) == 0:
+        return slice(0, 0)
+    return slice(rows[0], rows[-1] + 1)
+
+
+def quantile_turnover(factor_data: FactorData, lag: int = 1) -> DataFrame:
+    """
+    各分位组的换手率：第t期组内不在第t-lag期该组中的symbol占第t期组内symbol的比例
+    :return: 行索引为日期，列为分位组
+    """
+    quantile_labels = np.where(factor_data.mask, factor_data.factor_quantile, 0)
+    quantiles = [int(q) for q in np.unique(quantile_labels) if q > 0]
+
+    turnover = np.full((len(factor_data.index), len(quantiles)), np.nan)
+    for i, q in enumerate(quantiles):
+        member = quantile_labels == q
+        count = member.sum(axis=1)
+        if lag >= len(member):
+            continue
+
+        # 当期与lag期前都有数据的日期才有换手率
+        new_count = (member[lag:] & ~member[:-lag]).sum(axis=1)
+        both = (count[lag:] > 0) & (count[:-lag] > 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            turnover[lag:, i] = np.where(both, new_count / count[lag:], np.nan)
+
+    rows = _valid_rows(factor_data.mask.any(axis=1))
+    turnover_df = DataFrame(turnover[rows], index=factor_data.index[rows], columns=quantiles)
+    turnover_df.index.name = "date"
+    return turnover_df
+
+
+def factor_rank_autocorrelation(factor_data: FactorData, lags: Sequence[int] = (1,)) -> DataFrame:
+    """
+    因子排名的lag期自相关系数：每期横截面排名后，与lag期前的排名在共同的symbol上计算Pearson相关系数
+    排名只计算一次，所有lag共用
+    :return: 行索引为日期，列为各lag
+    """
+    mask = factor_data.mask
+    ranks = rank(np.where(mask, factor_data.factor, np.nan), pct=False)
+
+    autocorr = np.full((len(factor_data.index), len(lags)), np.nan)
+    for i, lag in enumerate(lags):
+        if lag >= len(ranks):
+            continue
+        both = mask[lag:] & mask[:-lag]
+        autocorr[lag:, i] = _row_corr(ranks[lag:], ranks[:-lag], both)
+
+    rows = _valid_rows(mask.any(axis=1))
+    autocorr_df = DataFrame(autocorr[rows], index=factor_data.index[rows], columns=list(lags))
+    autocorr_df.index.name = "date"
+    return autocorr_df
+
+
+def summary_turnover(factor_data: FactorData, lags: Sequence[int] = (1, 5, 10)) -> DataFrame:
+    """
+    换手率分析表格，与alphalens.plotting.plot_turnover_table一致：
+    各分位组的平均换手率及因子排名的平均自相关系数，列为各lag
+    """
+    lags = sorted(lags)
+    columns = [f"{lag}d" for lag in lags]
+
+    rows = {}
+    for lag, column in zip(lags, columns):
+        for q, turnover in quantile_turnover(factor_data, lag).items():
+            rows.setdefault(f"Quantile {q} Mean Turnover", {})[column] = turnover.mean()
+
+    autocorr = factor_rank_autocorrelation(factor_data, lags)
+    rows["Mean Factor Rank Autocorrelation"] = dict(zip(columns, autocorr.mean().to_numpy()))
+
+    return DataFrame.from_dict(rows, orient="index", columns=columns)
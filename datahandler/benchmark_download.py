@@ -0,0 +1,34 @@
+import time
+from datahandler import DataHandler
+from datahandler.datafeed.fake_datafeed import FakeDatafeed
+from datahandler.task_journal import TaskJournal
+from constant import QueryStatus
+from setting import SETTINGS
+
+# 使用本地模拟数据源压测下载流程；模拟数据源没有请求限制，可调高限速与并发
+SETTINGS["download.rate"] = 20
+SETTINGS["download.burst"] = 4
+SETTINGS["download.workers"] = 8
+
+handler = DataHandler("ashare")
+handler.datafeed = FakeDatafeed(latency=0.3, symbols_num=200, failure_rate=0.1)
+symbols = handler.datafeed.get_all_ashare_stock_symbol()
+
+start_time = time.perf_counter()
+task_name = handler.download_ashare_bar_data_to_database(symbols, "20130101", "20231231")
+cost = time.perf_counter() - start_time
+print(f"{len(symbols)}只股票用时{cost:.1f}秒，{len(symbols) / cost:.2f}只/秒")
+
+# 恢复任务：请求失败的symbol记为FAILED而非EMPTY，恢复时重新请求
+journal = TaskJournal(handler.get_task_path(task_name))
+failed = [symbol for symbol in symbols if journal.get_status(symbol) == QueryStatus.FAILED]
+journal.close()
+assert failed, "模拟数据源应有请求失败的symbol"
+
+handler.datafeed.failure_rate = 0.0
+handler.download_ashare_bar_data_to_database(symbols, "20130101", "20231231", resume=task_name)
+journal = TaskJournal(handler.get_task_path(task_name))
+retried = [symbol for symbol in failed if journal.get_status(symbol) == QueryStatus.SUCCESSED]
+journal.close()
+assert len(retried) == len(failed), f"{len(failed) - len(retried)}只失败的symbol在恢复任务时未被重新请求"
+print(f"恢复任务重新请求了{len(failed)}只上次失败的股票")
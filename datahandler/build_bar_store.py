@@ -0,0 +1,6 @@
+from environment import Environment
+
+# 将csv格式的bar数据转换为本地列式bar数据仓库，之后的因子分析脚本直接从仓库加载
+env = Environment("ashare")
+env.load_bar_data_from_csv("ashare_bar_data.csv")
+env.save_bar_data_to_store()
@@ -23,12 +23,13 @@ class DbBarData(Model):
 
     class Meta:
         table: str = "db_bar_data"
-        indexes: list = [("symbol", "exchange", "interval", "datetime"),]
+        unique_together: list = [("symbol", "exchange", "interval", "datetime"),]
 
 
 class DbFactorData(Model):
     id: int = fields.IntField(pk=True)
 
+    factor_key: str = fields.CharField(max_length=40)
     factor_name: str = fields.CharField(max_length=32)
     interval: str = fields.CharField(max_length=16)
 
@@ -40,4 +41,4 @@ class DbFactorData(Model):
 
     class Meta:
         table: str = "db_factor_data"
-        indexes: list = [("factor_name", "symbol", "exchange", "interval", "datetime"),]
+        indexes: list = [("factor_name", "symbol", "exchange", "interval", "datetime"), ("factor_key",)]
@@ -0,0 +1,287 @@
+import os
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from setting import SETTINGS
+
+
+# 列字段及其存储类型；symbol、exchange按分区内symbol索引存储，interval为分区键
+value_fields: Dict[str, str] = {
+    "open_price": "float64",
+    "high_price": "float64",
+    "low_price": "float64",
+    "close_price": "float64",
+    "volume": "float64",
+    "turnover": "float64"
+}
+
+
+def _to_market_timestamp(time: Union[str, datetime, pd.Timestamp], timezone: str) -> pd.Timestamp:
+    """无时区信息的时间按市场时区处理：日期“20240102”指市场当地的这一天，而非UTC的这一天"""
+    ts = pd.Timestamp(time)
+    if ts.tzinfo is None:
+        return ts.tz_localize(timezone)
+    return ts.tz_convert(timezone)
+
+
+class BarStore:
+    """
+    本地列式bar数据仓库
+    目录结构：{path}/interval={interval}/year={year}/{column}.{generation}.npy，
+    分区内的manifest.json记录当前版本号generation与行数，写入时最后替换，读取时按其选择各列文件并校验行数；
+    没有manifest.json的分区为旧格式，列文件为{column}.npy
+    每个分区内的数据按(symbol, datetime)排序，symbol.npy与offset.npy记录每个symbol在分区内的行区间，
+    因此每个(symbol, year)对应分区内一段连续的行；读取时按列加载（mmap），并按symbol、日期过滤
+    datetime以UTC存储；年份分区与开始、结束日期均按市场时区（如Asia/Shanghai当地0点的日度bar）划分
+    """
+
+    manifest_name: str = "manifest.json"
+
+    def __init__(self, path: Union[str, Path], timezone: Optional[str] = None) -> None:
+        self.path: Path = Path(path)
+        self.timezone: str = SETTINGS["timezone"] if timezone is None else timezone
+
+    def get_partition_dir(self, interval: str, year: int) -> Path:
+        return self.path.joinpath(f"interval={interval}").joinpath(f"year={year}")
+
+    def get_partition_years(self, interval: str) -> List[int]:
+        interval_dir = self.path.joinpath(f"interval={interval}")
+        if not interval_dir.exists():
+            return []
+
+        years = [int(p.name.split("=")[1]) for p in interval_dir.iterdir() if p.name.startswith("year=")]
+        return sorted(years)
+
+    def load_manifest(self, part_dir: Path) -> dict:
+        """分区的manifest；旧格式的分区返回版本号为空、行数未知"""
+        manifest_path = part_dir.joinpath(self.manifest_name)
+        if not manifest_path.exists():
+            return {"generation": "", "rows": None}
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def get_column_path(part_dir: Path, manifest: dict, name: str) -> Path:
+        generation = manifest["generation"]
+        return part_dir.joinpath(f"{name}.{generation}.npy" if generation else f"{name}.npy")
+
+    def get_query_range(
+            self,
+            interval: str,
+            start: Optional[Union[str, datetime]] = None,
+            end: Optional[Union[str, datetime]] = None
+    ) -> Tuple[List[int], Optional[int], Optional[int]]:
+        """:return: (需读取的年份分区, 开始时间ns, 结束时间ns（不含）)；日期为市场时区的日期"""
+        start_ns: Optional[int] = None
+        end_ns: Optional[int] = None
+        years = self.get_partition_years(interval)
+        if start is not None:
+            start_ts = _to_market_timestamp(start, self.timezone)
+            start_ns = start_ts.value
+            years = [y for y in years if y >= start_ts.year]
+        if end is not None:
+            # 结束日期包含市场当地的当天
+            end_ts = _to_market_timestamp(end, self.timezone).normalize() + pd.Timedelta(days=1)
+            end_ns = end_ts.value
+            years = [y for y in years if y <= (end_ts - pd.Timedelta(1)).year]
+        return years, start_ns, end_ns
+
+    def get_symbols(
+            self,
+            interval: str = "d",
+            start: Optional[Union[str, datetime]] = None,
+            end: Optional[Union[str, datetime]] = None
+    ) -> List[str]:
+        """时间范围所在分区内的全部symbol；只读取各分区的symbol.npy"""
+        years, _, _ = self.get_query_range(interval, start, end)
+        symbols = []
+        for year in years:
+            part_dir = self.get_partition_dir(interval, year)
+            symbols.append(np.load(self.get_column_path(part_dir, self.load_manifest(part_dir), "symbol")))
+        if not symbols:
+            return []
+        return np.unique(np.concatenate(symbols)).tolist()
+
+    def get_datetimes(
+            self,
+            interval: str = "d",
+            start: Optional[Union[str, datetime]] = None,
+            end: Optional[Union[str, datetime]] = None
+    ) -> pd.DatetimeIndex:
+        """时间范围内出现过的全部bar时间（UTC，升序）；只读取各分区的datetime.npy"""
+        years, start_ns, end_ns = self.get_query_range(interval, start, end)
+
+        dt_arrs = []
+        for year in years:
+            part_dir = self.get_partition_dir(interval, year)
+            dt_path = self.get_column_path(part_dir, self.load_manifest(part_dir), "datetime")
+            dt_arr = np.unique(np.load(dt_path, mmap_mode="r"))
+            if start_ns is not None:
+                dt_arr = dt_arr[dt_arr >= start_ns]
+            if end_ns is not None:
+                dt_arr = dt_arr[dt_arr < end_ns]
+            dt_arrs.append(dt_arr)
+
+        dt_arr = np.unique(np.concatenate(dt_arrs)) if dt_arrs else np.empty(0, dtype="int64")
+        return pd.DatetimeIndex(pd.to_datetime(dt_arr, utc=True))
+
+    def save_bar_data(self, bar_df: DataFrame) -> None:
+        """
+        :param bar_df: DataFrame, 每行为bar_data的一条记录；字段需与schema一致
+        已有分区中(symbol, datetime)相同的记录会被覆盖
+        """
+        bar_df = bar_df.copy()
+        bar_df["symbol"] = bar_df["symbol"].astype(str)
+        bar_df["datetime"] = pd.to_datetime(bar_df["datetime"], utc=True)
+        bar_df["year"] = bar_df["datetime"].dt.tz_convert(self.timezone).dt.year
+
+        for (interval, year), part_df in bar_df.groupby(["interval", "year"]):
+            part_dir = self.get_partition_dir(interval, year)
+            if part_dir.exists():
+                old_df = self._read_partition(part_dir, interval, list(value_fields))
+                part_df = pd.concat([old_df, part_df], ignore_index=True)
+
+            part_df = part_df.drop_duplicates(subset=["symbol", "datetime"], keep="last")
+            part_df = part_df.sort_values(["symbol", "datetime"], kind="stable")
+            self._write_partition(part_dir, part_df)
+
+    def _write_partition(self, part_dir: Path, part_df: DataFrame) -> None:
+        part_dir.mkdir(parents=True, exist_ok=True)
+
+        symbol_arr = part_df["symbol"].to_numpy(dtype=str)
+        symbols, starts = np.unique(symbol_arr, return_index=True)
+        offsets = np.append(starts, len(symbol_arr)).astype("int64")
+        exchanges = part_df["exchange"].to_numpy(dtype=str)[starts]
+
+        columns: Dict[str, np.ndarray] = {
+            "symbol": symbols,
+            "offset": offsets,
+            "exchange": exchanges,
+            "datetime": part_df["datetime"].to_numpy(dtype="datetime64[ns]").view("int64")
+        }
+        for field, dtype in value_fields.items():
+            columns[field] = part_df[field].to_numpy(dtype=dtype)
+
+        # 各列先写入新版本的文件，最后替换manifest.json一次切换版本：替换前读取到的是完整的旧版本，
+        # 替换后是完整的新版本，中断时不会出现新旧版本的列混合的分区
+        generation = f"{time.time_ns():x}"
+        for name, arr in columns.items():
+            np.save(part_dir.joinpath(f"{name}.{generation}.npy"), arr)
+
+        manifest = {"generation": generation, "rows": len(symbol_arr)}
+        tmp_path = part_dir.joinpath(f"{self.manifest_name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, part_dir.joinpath(self.manifest_name))
+
+        # 清理其他版本（含旧格式、中断时留下）的列文件；仍被读取而无法删除的文件留待下次写入时清理
+        for path in part_dir.glob("*.npy"):
+            if not path.name.endswith(f".{generation}.npy"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def _read_partition(
+            self,
+            part_dir: Path,
+            interval: str,
+            fields: List[str],
+            symbols: Optional[np.ndarray] = None,
+            start: Optional[int] = None,
+            end: Optional[int] = None
+    ) -> DataFrame:
+        # 整个分区使用同一个manifest中的版本，不会读到不同版本的列
+        manifest = self.load_manifest(part_dir)
+        part_symbols: np.ndarray = np.load(self.get_column_path(part_dir, manifest, "symbol"))
+        offsets: np.ndarray = np.load(self.get_column_path(part_dir, manifest, "offset"))
+        exchanges: np.ndarray = np.load(self.get_column_path(part_dir, manifest, "exchange"))
+        if manifest["rows"] is not None and offsets[-1] != manifest["rows"]:
+            raise ValueError(f"分区{part_dir}的行数{offsets[-1]}与manifest记录的{manifest['rows']}不一致")
+
+        # symbol过滤：只读取所需symbol的行区间
+        if symbols is None:
+            symbol_idx = np.arange(len(part_symbols))
+        else:
+            symbol_idx = np.flatnonzero(np.isin(part_symbols, symbols))
+
+        counts = offsets[symbol_idx + 1] - offsets[symbol_idx]
+        if len(symbol_idx) == len(part_symbols):
+            rows = slice(None)
+        else:
+            rows = np.concatenate(
+                [np.arange(offsets[i], offsets[i + 1]) for i in symbol_idx] + [np.empty(0, dtype="int64")]
+            )
+
+        dt_arr = np.asarray(np.load(self.get_column_path(part_dir, manifest, "datetime"), mmap_mode="r")[rows])
+        row_symbol_idx = np.repeat(symbol_idx, counts)
+
+        # 日期过滤
+        mask = np.ones(len(dt_arr), dtype=bool)
+        if start is not None:
+            mask &= dt_arr >= start
+        if end is not None:
+            mask &= dt_arr < end
+        if not mask.all():
+            dt_arr = dt_arr[mask]
+            row_symbol_idx = row_symbol_idx[mask]
+            rows = np.arange(len(mask))[mask] if isinstance(rows, slice) else rows[mask]
+
+        data: Dict[str, object] = {
+            "symbol": part_symbols[row_symbol_idx].astype(object),
+            "exchange": exchanges[row_symbol_idx].astype(object),
+            "interval": interval,
+            "datetime": pd.to_datetime(dt_arr, utc=True)
+        }
+        # 列裁剪：未请求的字段文件不会被读取
+        for field in fields:
+            column = np.load(self.get_column_path(part_dir, manifest, field), mmap_mode="r")
+            if manifest["rows"] is not None and len(column) != manifest["rows"]:
+                raise ValueError(f"分区{part_dir}的{field}列行数{len(column)}与manifest记录的{manifest['rows']}不一致")
+            data[field] = np.asarray(column[rows])
+
+        return DataFrame(data)
+
+    def load_bar_data(
+            self,
+            interval: str = "d",
+            symbols: Optional[Union[str, List[str]]] = None,
+            start: Optional[Union[str, datetime]] = None,
+            end: Optional[Union[str, datetime]] = None,
+            fields: Optional[List[str]] = None
+    ) -> DataFrame:
+        """
+        :param interval: bar数据频率
+        :param symbols: 股票代码；None表示全部
+        :param start: 开始日期（含），如“20190101”
+        :param end: 结束日期（含），如“20231231”
+        :param fields: 需要读取的价格/成交量字段；None表示全部
+        :return: 字段与csv/数据库一致的长表DataFrame
+        """
+        if fields is None:
+            fields = list(value_fields)
+        else:
+            unknown = set(fields) - set(value_fields)
+            if unknown:
+                raise ValueError(f"不支持的字段：{unknown}")
+
+        if type(symbols) is str:
+            symbols = [symbols]
+        symbol_arr = None if symbols is None else np.asarray(symbols, dtype=str)
+
+        years, start_ns, end_ns = self.get_query_range(interval, start, end)
+        part_dfs = [
+            self._read_partition(self.get_partition_dir(interval, year), interval, fields, symbol_arr, start_ns, end_ns)
+            for year in years
+        ]
+        if not part_dfs:
+            return DataFrame(columns=["symbol", "exchange", "interval", "datetime"] + fields)
+
+        bar_df = pd.concat(part_dfs, ignore_index=True)
+        return bar_df
@@ -1,11 +1,12 @@
-from typing import Dict, List, Union
+from typing import Dict, List, Union, Tuple, Optional
+import numpy as np
 import pandas as pd
-from pandas import DataFrame
+from pandas import DataFrame, Series
 from tortoise import Tortoise
+from tortoise.transactions import in_transaction
 from datetime import datetime
-from datahandler.datafeed.akshare_datafeed import AkshareDatafeed
 
-from datahandler.database.ashare_schemas import DbBarData
+from datahandler.database.ashare_schemas import DbBarData, DbFactorData
 from constant import Market, Interval
 from setting import SETTINGS
 
@@ -24,6 +25,9 @@ Market_models_map: Dict[Market, str] = {
 }
 
 
+value_columns: List[str] = ["open_price", "high_price", "low_price", "close_price", "volume", "turnover"]
+
+
 class MysqlDatabase:
     def __init__(self, market: str) -> None:
         market: Market = Market(market)
@@ -43,45 +47,175 @@ class MysqlDatabase:
         )
 
         await Tortoise.generate_schemas(safe=True)
+        await self.migrate_factor_table()
         self.connected = True
 
+    async def migrate_factor_table(self) -> None:
+        """
+        generate_schemas(safe=True)不修改已有的表：旧版本创建的因子表没有factor_key列，在此补上列与索引
+        旧记录的factor_key为空字符串，不会被任何因子指纹命中，相当于缓存失效
+        """
+        table: str = DbFactorData._meta.db_table
+        conn = Tortoise.get_connection("default")
+        _, rows = await conn.execute_query(
+            "SELECT COUNT(*) AS n FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%s AND COLUMN_NAME='factor_key'",
+            [table]
+        )
+        if rows[0]["n"] == 0:
+            await conn.execute_query(
+                f"ALTER TABLE `{table}` ADD COLUMN `factor_key` VARCHAR(40) NOT NULL DEFAULT '' AFTER `id`, "
+                f"ADD INDEX `idx_{table}_factor_key` (`factor_key`)"
+            )
+
     async def save_bar_data(self, bars_df: DataFrame) -> bool:
         """
         :param bars_df: DataFrame, 每行为bar_data的一条记录；字段需与schema一致
         :return:
         """
+        await self.bulk_save_bar_data(bars_df)
+        return True
+
+    async def bulk_save_bar_data(self, bars_df: DataFrame, chunk_size: int = 5000) -> Tuple[int, int]:
+        """
+        按块批量写入bar数据，依赖(symbol, exchange, interval, datetime)唯一索引去重；
+        已存在的记录保持不变（与get_or_create一致）
+        :param bars_df: DataFrame, 每行为bar_data的一条记录；字段需与schema一致
+        :param chunk_size: 每条INSERT语句包含的行数
+        :return: (写入行数, 跳过行数)
+        """
         if not self.connected:
             await self.connect()
 
-        records = bars_df.to_dict(orient='records')
-
-        for record in records:
-            await DbBarData.get_or_create(
-                symbol=record["symbol"],
-                exchange=record["exchange"],
-                interval=record["interval"],
-                datetime=record["datetime"],
-                defaults={
-                    "open_price": record["open_price"],
-                    "high_price": record["high_price"],
-                    "low_price": record["low_price"],
-                    "close_price": record["close_price"],
-                    "volume": record["volume"],
-                    "turnover": record["turnover"]
-
-                }
-            )
-        return True
+        if len(bars_df) == 0:
+            return 0, 0
+
+        columns: List[str] = ["symbol", "exchange", "interval", "datetime"] + value_columns
+        values_df = bars_df[columns].copy()
+        values_df["datetime"] = pd.to_datetime(values_df["datetime"]).dt.strftime("%Y-%m-%d %H:%M:%S")
+        values_df = values_df.astype(object).where(values_df.notna(), None)
+        rows: List[tuple] = list(values_df.itertuples(index=False, name=None))
+
+        # 重复键时执行空更新，affected rows对新写入的行计1，对已存在的行计0
+        table: str = DbBarData._meta.db_table
+        col_sql = ", ".join(f"`{col}`" for col in columns)
+        row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        conn = Tortoise.get_connection("default")
+
+        inserted: int = 0
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i: i + chunk_size]
+            sql = (f"INSERT INTO `{table}` ({col_sql}) VALUES " + ", ".join([row_sql] * len(chunk))
+                   + " ON DUPLICATE KEY UPDATE `id`=`id`")
+            params = [value for row in chunk for value in row]
+            affected, _ = await conn.execute_query(sql, params)
+            inserted += affected
+
+        skipped: int = len(rows) - inserted
+        return inserted, skipped
+
+    async def save_factor_data(
+            self,
+            factor_key: str,
+            factor_name: str,
+            interval: str,
+            factor_series: Series,
+            chunk_size: int = 5000
+    ) -> int:
+        """
+        批量写入因子值；删除同一factor_key的旧记录与分块写入在同一事务中完成，
+        中断或失败时回滚，不会留下被当作缓存命中的部分数据
+        :param factor_series: 以(datetime, symbol)为索引的因子值
+        :return: 写入行数
+        """
+        from utilities import match_stock_exchange
+
+        if not self.connected:
+            await self.connect()
+
+        table: str = DbFactorData._meta.db_table
+        factor_series = factor_series.dropna()
+        datetimes = (pd.DatetimeIndex(factor_series.index.get_level_values(0)).tz_convert("UTC")
+                     .strftime("%Y-%m-%d %H:%M:%S"))
+        symbols = factor_series.index.get_level_values(1).astype(str)
+        exchange_map = {symbol: match_stock_exchange(symbol) for symbol in symbols.unique()}
+
+        rows: List[tuple] = [
+            (factor_key, factor_name, interval, symbol, exchange_map[symbol], dt, float(value))
+            for symbol, dt, value in zip(symbols, datetimes, factor_series.to_numpy())
+        ]
+
+        columns = ["factor_key", "factor_name", "interval", "symbol", "exchange", "datetime", "factor_value"]
+        col_sql = ", ".join(f"`{col}`" for col in columns)
+        row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+
+        async with in_transaction("default") as conn:
+            await conn.execute_query(f"DELETE FROM `{table}` WHERE `factor_key`=%s", [factor_key])
+            for i in range(0, len(rows), chunk_size):
+                chunk = rows[i: i + chunk_size]
+                sql = f"INSERT INTO `{table}` ({col_sql}) VALUES " + ", ".join([row_sql] * len(chunk))
+                params = [value for row in chunk for value in row]
+                await conn.execute_query(sql, params)
+
+        return len(rows)
+
+    async def query_factor_data(self, factor_key: str) -> DataFrame:
+        """
+        :return: 字段为symbol、datetime（UTC）、factor_value的DataFrame
+        """
+        if not self.connected:
+            await self.connect()
+
+        table: str = DbFactorData._meta.db_table
+        sql = f"SELECT `symbol`, `datetime`, `factor_value` FROM `{table}` WHERE `factor_key`=%s"
+        conn = Tortoise.get_connection("default")
+        _, rows = await conn.execute_query(sql, [factor_key])
+
+        factor_df = pd.DataFrame(rows, columns=["symbol", "datetime", "factor_value"])
+        factor_df["datetime"] = pd.to_datetime(factor_df["datetime"], utc=True)
+        return factor_df
+
+    async def query_latest_bar_datetime(
+            self,
+            interval: Interval,
+            symbols: Optional[List[str]] = None
+            ) -> Dict[str, datetime]:
+        """
+        一次分组查询每个symbol已存储的最新bar时间
+        :return: {symbol: 最新datetime}；数据库中没有记录的symbol不在结果中
+        """
+        if not self.connected:
+            await self.connect()
+
+        table: str = DbBarData._meta.db_table
+        sql = f"SELECT `symbol`, MAX(`datetime`) AS latest FROM `{table}` WHERE `interval`=%s"
+        params: list = [interval.value]
+        if symbols is not None:
+            if not symbols:
+                return {}
+            sql += " AND `symbol` IN (" + ", ".join(["%s"] * len(symbols)) + ")"
+            params += list(symbols)
+        sql += " GROUP BY `symbol`"
+
+        conn = Tortoise.get_connection("default")
+        _, rows = await conn.execute_query(sql, params)
+        return {row["symbol"]: row["latest"] for row in rows}
 
     async def query_ashare_bar_data(
             self,
             symbols: List[str],
             interval: Interval,
             start: Union[str, datetime],
-            end: Union[str, datetime]
+            end: Union[str, datetime],
+            raw: bool = False,
+            fields: Optional[List[str]] = None,
+            chunk_size: int = 100000
             ) -> DataFrame:
         """
         时间如果是字符串，需为形如“20240101”的格式
+        :param raw: 为True时不构建ORM对象，直接流式读取原始元组并写入numpy列
+        :param fields: raw模式下需要返回的价格/成交量字段；None表示全部
+        :param chunk_size: raw模式下每次从游标读取的行数
         """
         if self.market != Market.ASHARE:
             print("当前市场类型不支持此函数")
@@ -94,6 +228,9 @@ class MysqlDatabase:
         start = _to_datetime(start)
         end = _to_datetime(end)
 
+        if raw:
+            return await self._query_bar_arrays(symbols, interval, start, end, fields, chunk_size)
+
         bar_datas = await (
                 DbBarData.filter(
                     symbol__in=symbols,
@@ -124,3 +261,78 @@ class MysqlDatabase:
         bar_df = pd.DataFrame(data)
         return bar_df
 
+
+    async def _query_bar_arrays(
+            self,
+            symbols: List[str],
+            interval: Interval,
+            start: datetime,
+            end: datetime,
+            fields: Optional[List[str]],
+            chunk_size: int
+            ) -> DataFrame:
+        """先统计行数并预分配各列数组，再用无缓冲游标分块读取，峰值内存接近最终DataFrame大小"""
+        try:
+            from asyncmy.cursors import SSCursor
+        except ImportError:
+            from aiomysql import SSCursor
+
+        if not self.connected:
+            await self.connect()
+
+        if fields is None:
+            fields = value_columns
+        else:
+            unknown = set(fields) - set(value_columns)
+            if unknown:
+                raise ValueError(f"不支持的字段：{unknown}")
+
+        if not symbols:
+            return pd.DataFrame(columns=["symbol", "exchange", "interval", "datetime"] + fields)
+
+        key_columns: List[str] = ["symbol", "exchange", "interval", "datetime"]
+        columns: List[str] = key_columns + list(fields)
+
+        table: str = DbBarData._meta.db_table
+        symbol_sql = ", ".join(["%s"] * len(symbols))
+        where_sql = f"`symbol` IN ({symbol_sql}) AND `interval`=%s AND `datetime`>=%s AND `datetime`<=%s"
+        params = list(symbols) + [interval.value, start, end]
+
+        conn = Tortoise.get_connection("default")
+        _, count_rows = await conn.execute_query(f"SELECT COUNT(*) AS n FROM `{table}` WHERE {where_sql}", params)
+        n: int = count_rows[0]["n"]
+
+        buffers: Dict[str, np.ndarray] = {
+            "symbol": np.empty(n, dtype=object),
+            "exchange": np.empty(n, dtype=object),
+            "interval": np.empty(n, dtype=object),
+            "datetime": np.empty(n, dtype="datetime64[ns]")
+        }
+        for field in fields:
+            buffers[field] = np.full(n, np.nan, dtype="float64")
+
+        col_sql = ", ".join(f"`{col}`" for col in columns)
+        sql = f"SELECT {col_sql} FROM `{table}` WHERE {where_sql} ORDER BY `datetime`"
+
+        filled: int = 0
+        async with conn.acquire_connection() as connection:
+            async with connection.cursor(SSCursor) as cursor:
+                await cursor.execute(sql, params)
+                while True:
+                    rows = await cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+
+                    # 并发写入导致行数多于统计值时截断
+                    rows = rows[: n - filled]
+                    stop = filled + len(rows)
+                    for col, values in zip(columns, zip(*rows)):
+                        buffers[col][filled: stop] = values
+                    filled = stop
+
+        if filled < n:
+            buffers = {col: arr[:filled] for col, arr in buffers.items()}
+
+        buffers["datetime"] = pd.to_datetime(buffers["datetime"], utc=True)
+        bar_df = pd.DataFrame(buffers, copy=False)
+        return bar_df
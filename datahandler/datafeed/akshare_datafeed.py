@@ -21,7 +21,7 @@ class AkshareDatafeed:
         """
         采用akshare的stock_zh_a_daily接口
         参考：https://zhuanlan.zhihu.com/p/671295006, 该接口数据的复权方式并非加减复权，适合回测
-        多次获取容易封禁 IP，因此设计中采用sleep，不采用多线程，运行时间长
+        多次获取容易封禁 IP，调用方需限速（见DataHandler的令牌桶设置）
         :param symbol: 股票代码, 如“sh600000”
         :param start: 开始日期， “YYYYmmdd”
         :param end: 结束日期， “YYYYmmdd”
@@ -44,7 +44,8 @@ class AkshareDatafeed:
             data_df["exchange"] = exchange
             data_df["interval"] = Interval.DAILY.value
             data_df["datetime"] = data_df["datetime"].astype(str)
-        else:
+        elif query_status == QueryStatus.SUCCESSED:
+            # 请求失败时保持FAILED，恢复任务时会重新请求；只有请求成功且没有数据时为EMPTY
             query_status = QueryStatus.EMPTY
 
         return data_df, query_status
@@ -0,0 +1,54 @@
+import time
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from typing import List, Tuple
+from utilities import match_stock_exchange
+from constant import Interval, QueryStatus
+
+
+class FakeDatafeed:
+    """
+    本地模拟数据源，接口与AkshareDatafeed一致；
+    按latency模拟网络延迟，返回随机生成的日度bar数据，用于下载流程的压测；
+    failure_rate为模拟请求失败的比例，用于检查失败的symbol在恢复任务时被重新请求
+    """
+
+    def __init__(self, latency: float = 0.5, symbols_num: int = 100, seed: int = 0, failure_rate: float = 0.0) -> None:
+        self.latency: float = latency
+        self.symbols_num: int = symbols_num
+        self.seed: int = seed
+        self.failure_rate: float = failure_rate
+        self.failure_rng = np.random.default_rng(seed)
+
+    def query_ashare_daily(self, symbol: str, start: str, end: str, adjust: str = "hfq") -> Tuple[DataFrame, QueryStatus]:
+        time.sleep(self.latency)
+
+        if self.failure_rng.random() < self.failure_rate:
+            return pd.DataFrame(), QueryStatus.FAILED
+
+        dates = pd.bdate_range(start, end)
+        if len(dates) == 0:
+            return pd.DataFrame(), QueryStatus.EMPTY
+
+        rng = np.random.default_rng(self.seed + int(symbol))
+        close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        open_ = close * (1 + rng.normal(0, 0.005, len(dates)))
+
+        data_df = pd.DataFrame({
+            "datetime": dates.strftime("%Y-%m-%d"),
+            "open_price": open_,
+            "high_price": np.maximum(open_, close) * 1.01,
+            "low_price": np.minimum(open_, close) * 0.99,
+            "close_price": close,
+            "volume": rng.integers(1e5, 1e7, len(dates)).astype(float),
+        })
+        data_df["turnover"] = data_df["volume"] * data_df["close_price"]
+        data_df["symbol"] = symbol
+        data_df["exchange"] = match_stock_exchange(symbol)
+        data_df["interval"] = Interval.DAILY.value
+
+        return data_df, QueryStatus.SUCCESSED
+
+    def get_all_ashare_stock_symbol(self) -> List[str]:
+        return [f"{600000 + i:06d}" for i in range(self.symbols_num)]
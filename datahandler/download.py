@@ -2,4 +2,5 @@ from handler import DataHandler
 
 handler = DataHandler("ashare")
 symbols = handler.get_all_ashare_stock_symbol()
-handler.download_ashare_bar_data_to_database(symbols, "20130101", "20231231")
+# 增量同步到当天：每个symbol从数据库中最新bar的下一天开始下载
+handler.download_ashare_bar_data_to_database(symbols, "20130101", incremental=True)
@@ -1,86 +1,229 @@
 import asyncio
-from tortoise import run_async
-from typing import Union, List
-import random
-import time
+from typing import Union, List, Dict
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from pandas import DataFrame
-import jqdatasdk as jq
 from tqdm import tqdm
 from pathlib import Path
 from typing import Optional
 
 from log.logger import Logger
 from constant import Market, QueryStatus, Interval
-from .database.mysql_database import MysqlDatabase
-from .datafeed.akshare_datafeed import AkshareDatafeed
+from .rate_limiter import TokenBucket
+from .task_journal import TaskJournal
 from setting import SETTINGS
 
 
+def run_async(coro) -> None:
+    from tortoise import run_async as tortoise_run_async
+    tortoise_run_async(coro)
+
+
 class DataHandler:
+    """datafeed、database与jqdatasdk会话均在首次使用时创建，相应的模块也在此时才导入"""
+
     def __init__(self, market: str) -> None:
         self.market: Market = Market(market)
-        self.datafeed = AkshareDatafeed()
-        self.database = MysqlDatabase(market)
-        self.loop = asyncio.get_event_loop()
+        self._datafeed = None
+        self._database = None
+        self._jq = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         self.logger = Logger("DataHandler")
 
-        # 添加jqdatasdk环境，方便使用一些jqdata的函数
         self.jq_user_name: str = SETTINGS["jq.user_name"]
         self.jq_password: str = SETTINGS["jq.password"]
-        jq.auth(self.jq_user_name, self.jq_password)
 
-    def download_bar_data_to_database(self, symbols: Union[str, List[str]], start: str, end: str, interval: str) -> None:
+    @property
+    def datafeed(self):
+        if self._datafeed is None:
+            from .datafeed.akshare_datafeed import AkshareDatafeed
+            self._datafeed = AkshareDatafeed()
+        return self._datafeed
+
+    @datafeed.setter
+    def datafeed(self, datafeed) -> None:
+        self._datafeed = datafeed
+
+    @property
+    def database(self):
+        if self._database is None:
+            from .database.mysql_database import MysqlDatabase
+            self._database = MysqlDatabase(self.market.value)
+        return self._database
+
+    @database.setter
+    def database(self, database) -> None:
+        self._database = database
+
+    @property
+    def jq(self):
+        """添加jqdatasdk环境，方便使用一些jqdata的函数"""
+        if self._jq is None:
+            import jqdatasdk
+            jqdatasdk.auth(self.jq_user_name, self.jq_password)
+            self._jq = jqdatasdk
+        return self._jq
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        return self._loop
+
+    def download_bar_data_to_database(
+            self,
+            symbols: Union[str, List[str]],
+            start: str,
+            end: Optional[str],
+            interval: str,
+            incremental: bool = False,
+            resume: Optional[str] = None
+    ) -> Optional[str]:
         if self.market == Market.ASHARE:
-            self.download_ashare_bar_data_to_database(symbols, start, end)
+            return self.download_ashare_bar_data_to_database(symbols, start, end, incremental, resume)
+        return None
+
+    @staticmethod
+    def get_task_path(task_name: str) -> Path:
+        """下载任务的状态日志路径"""
+        return (Path(SETTINGS["project.abs_path"]).joinpath(SETTINGS["log.file_direction"])
+                .joinpath(f"{task_name}.csv"))
 
-    def download_ashare_bar_data_to_database(self, symbols: Union[str, List[str]], start: str, end: str) -> None:
-        """目前新浪的接口仅有日度数据，暂不考虑其他数据频率"""
+    def download_ashare_bar_data_to_database(
+            self,
+            symbols: Union[str, List[str]],
+            start: str,
+            end: Optional[str] = None,
+            incremental: bool = False,
+            resume: Optional[str] = None
+    ) -> str:
+        """
+        目前新浪的接口仅有日度数据，暂不考虑其他数据频率
+        :param start: 开始日期， “YYYYmmdd”
+        :param end: 结束日期， “YYYYmmdd”；None为当天
+        :param incremental: 为True时只下载数据库中每个symbol最新bar之后的数据
+        :param resume: 需要恢复的任务名，如“download_ashare_bar_data_to_database-2024_05_16_14_51_59”；
+                       该任务中状态为SUCCESSED或EMPTY的symbol将被跳过，FAILED的symbol重新请求
+        :return: 任务名，可用于恢复任务
+        """
         if not self.database.connected:
             run_async(self.database.connect())
 
-        time_str = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-        task_name: str = f"download_ashare_bar_data_to_database-{time_str}"
+        if end is None:
+            end = datetime.now().strftime("%Y%m%d")
+
+        if resume is None:
+            time_str = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+            task_name: str = f"download_ashare_bar_data_to_database-{time_str}"
+        else:
+            task_name: str = resume
         self.logger.add_file_handler(task_name)
 
         if type(symbols) is str:
             symbols = [symbols]
 
-        task_df: DataFrame = pd.DataFrame({
-            "task": symbols,
-            "status": [QueryStatus.NOTQUERIED.value] * len(symbols)
-        })
+        journal = TaskJournal(self.get_task_path(task_name))
+        journal.add_tasks(symbols)
 
-        task_path = (Path(SETTINGS["project.abs_path"]).joinpath(SETTINGS["log.file_direction"])
-                     .joinpath(f"{task_name}.csv"))
-
-        task_df.to_csv(task_path,index=False, mode="w")
+        finished = (QueryStatus.SUCCESSED, QueryStatus.EMPTY)
+        symbols = [symbol for symbol in symbols if journal.get_status(symbol) not in finished]
+        if resume is not None:
+            failed_num = sum(journal.get_status(symbol) == QueryStatus.FAILED for symbol in symbols)
+            self.logger.info(f"恢复任务{task_name}，剩余{len(symbols)}只股票，其中{failed_num}只上次请求失败")
 
         async def _download_ashare_bar_data_to_database():
-            iters = tqdm(symbols)
-            for symbol in iters:
-                df, status = self.datafeed.query_ashare_daily(symbol, "20130101", "20231231")
-                sleep_time = random.randint(4, 7)
-                time.sleep(sleep_time)
-
-                idx = task_df[task_df["task"] == symbol].index
-                if status == QueryStatus.SUCCESSED:
-                    await self.database.save_bar_data(df)
-                    task_df.loc[idx, "status"] = QueryStatus.SUCCESSED
-                elif status == QueryStatus.EMPTY:
-                    self.logger.info(f"股票{symbol}的数据为空")
-                    task_df.loc[idx, "status"] = QueryStatus.EMPTY
-                elif status == QueryStatus.FAILED:
-                    self.logger.warning(f"股票{symbol}查询失败")
-                    task_df.loc[idx, "status"] = QueryStatus.FAILED
-
-                task_df.to_csv(task_path,index=False, mode="w")
-                iters.set_description(f"Processing {symbol}")
+            latest_map: Dict[str, datetime] = {}
+            if incremental:
+                latest_map = await self.database.query_latest_bar_datetime(Interval.DAILY, symbols)
+
+            # 抓取协程在线程池中调用同步的datafeed，写库协程从有界队列取结果，二者并行
+            loop = asyncio.get_running_loop()
+            executor = ThreadPoolExecutor(max_workers=SETTINGS["download.workers"])
+            limiter = TokenBucket(SETTINGS["download.rate"], SETTINGS["download.burst"])
+            symbol_queue: asyncio.Queue = asyncio.Queue()
+            result_queue: asyncio.Queue = asyncio.Queue(maxsize=SETTINGS["download.queue_size"])
+            progress = tqdm(total=len(symbols))
+
+            def set_status(symbol: str, status: QueryStatus) -> None:
+                journal.set_status(symbol, status)
+                progress.set_description(f"Processing {symbol}")
+                progress.update(1)
+
+            for symbol in symbols:
+                symbol_start: str = start
+                if symbol in latest_map:
+                    next_day = pd.Timestamp(latest_map[symbol]).normalize() + pd.Timedelta(days=1)
+                    symbol_start = max(start, next_day.strftime("%Y%m%d"))
+
+                if symbol_start > end:
+                    # 数据库中的数据已是最新，无需请求
+                    set_status(symbol, QueryStatus.EMPTY)
+                    continue
+                symbol_queue.put_nowait((symbol, symbol_start))
+
+            async def fetch_worker():
+                while not symbol_queue.empty():
+                    symbol, symbol_start = symbol_queue.get_nowait()
+                    await limiter.acquire()
+                    df, status = await loop.run_in_executor(
+                        executor, self.datafeed.query_ashare_daily, symbol, symbol_start, end
+                    )
+                    await result_queue.put((symbol, df, status))
+
+            async def db_writer():
+                try:
+                    while True:
+                        item = await result_queue.get()
+                        if item is None:
+                            break
+
+                        symbol, df, status = item
+                        if status == QueryStatus.SUCCESSED:
+                            try:
+                                inserted, skipped = await self.database.bulk_save_bar_data(df)
+                                self.logger.info(f"股票{symbol}写入{inserted}条，跳过{skipped}条")
+                            except Exception as e:
+                                self.logger.warning(f"股票{symbol}写入数据库失败：{e}")
+                                status = QueryStatus.FAILED
+                        elif status == QueryStatus.EMPTY:
+                            self.logger.info(f"股票{symbol}的数据为空")
+                        elif status == QueryStatus.FAILED:
+                            self.logger.warning(f"股票{symbol}查询失败")
+
+                        set_status(symbol, status)
+                finally:
+                    # 写库协程异常退出时，抓取协程可能阻塞在有界队列上，取消它们
+                    for task in fetch_tasks:
+                        task.cancel()
+
+            fetch_tasks = [asyncio.ensure_future(fetch_worker()) for _ in range(SETTINGS["download.workers"])]
+            fetch_all = asyncio.gather(*fetch_tasks)
+            writer = asyncio.ensure_future(db_writer())
+            try:
+                # 抓取全部结束、任一抓取协程出错或写库协程提前结束（只会是出错）时返回，并抛出首个异常
+                done, _ = await asyncio.wait([fetch_all, writer], return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            finally:
+                for task in fetch_tasks:
+                    task.cancel()
+                # 无论抓取是否出错都放入结束标记，写库协程写完已抓取的结果后退出，不会一直等待
+                if not writer.done():
+                    await result_queue.put(None)
+                await asyncio.gather(writer, fetch_all, *fetch_tasks, return_exceptions=True)
+                executor.shutdown()
+                progress.close()
 
+            # 抓取正常结束时，写库协程的异常在此抛出
+            writer.result()
             self.logger.info("任务完成")
 
-        run_async(_download_ashare_bar_data_to_database())
+        try:
+            run_async(_download_ashare_bar_data_to_database())
+        finally:
+            journal.close()
+        return task_name
 
     def get_all_ashare_stock_symbol(self) -> List[str]:
         if self.market == Market.ASHARE:
@@ -94,17 +237,19 @@ class DataHandler:
             symbols: Union[str, List[str]],
             interval: str,
             start: str,
-            end: str
+            end: str,
+            fields: Optional[List[str]] = None
         ) -> DataFrame:
         if self.market == Market.ASHARE:
-            return self.get_ashare_bar_data(symbols, interval, start, end)
+            return self.get_ashare_bar_data(symbols, interval, start, end, fields)
 
     def get_ashare_bar_data(
             self,
             symbols: Union[str, List[str]],
             interval: str,
             start: str,
-            end: str
+            end: str,
+            fields: Optional[List[str]] = None
         ) -> DataFrame:
 
         if not self.database.connected:
@@ -112,13 +257,13 @@ class DataHandler:
 
         if type(symbols) is str:
             if symbols == "all":
-                symbols = AkshareDatafeed.get_all_ashare_stock_symbol()
+                symbols = self.get_all_ashare_stock_symbol()
             else:
                 symbols = [symbols]
 
         loop = self.loop
         future = asyncio.ensure_future(
-            self.database.query_ashare_bar_data(symbols, Interval(interval), start, end),
+            self.database.query_ashare_bar_data(symbols, Interval(interval), start, end, raw=True, fields=fields),
             loop=loop
         )
         loop.run_until_complete(future)
@@ -0,0 +1,33 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    异步令牌桶限速器
+    令牌以rate个/秒的速度补充，最多积累capacity个；每次请求前acquire一个令牌
+    """
+
+    def __init__(self, rate: float, capacity: int = 1) -> None:
+        if rate <= 0:
+            raise ValueError("rate需大于0")
+
+        self.rate: float = rate
+        self.capacity: int = max(capacity, 1)
+        self.tokens: float = self.capacity
+        self.updated_at: float = time.monotonic()
+        self.lock: asyncio.Lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        # 加锁保证等待中的协程按顺序取得令牌，不会同时醒来超发
+        async with self.lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
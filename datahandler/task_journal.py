@@ -0,0 +1,58 @@
+from pathlib import Path
+from typing import Dict, List, Union
+from constant import QueryStatus
+
+
+class TaskJournal:
+    """
+    追加写入的任务状态日志（csv格式：task,status）
+    每次状态变化追加一行，同一task以最后一行为准；可从已有日志恢复各task的状态
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path: Path = Path(path)
+        self.status_map: Dict[str, QueryStatus] = {}
+
+        if self.path.exists():
+            self.replay()
+            self.file = open(self.path, "a", encoding="utf-8")
+        else:
+            self.file = open(self.path, "w", encoding="utf-8")
+            self.file.write("task,status\n")
+            self.file.flush()
+
+    @staticmethod
+    def parse_status(text: str) -> QueryStatus:
+        # 兼容旧版本写入的“QueryStatus.SUCCESSED”格式
+        if text.startswith("QueryStatus."):
+            return QueryStatus[text.split(".", 1)[1]]
+        return QueryStatus(text)
+
+    def replay(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            next(f, None)
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                task, status = line.rsplit(",", 1)
+                self.status_map[task] = self.parse_status(status)
+
+    def add_tasks(self, tasks: List[str]) -> None:
+        """登记尚未出现在日志中的task，状态为NOTQUERIED"""
+        new_tasks = [task for task in tasks if task not in self.status_map]
+        for task in new_tasks:
+            self.status_map[task] = QueryStatus.NOTQUERIED
+        self.file.write("".join(f"{task},{QueryStatus.NOTQUERIED.value}\n" for task in new_tasks))
+        self.file.flush()
+
+    def set_status(self, task: str, status: QueryStatus) -> None:
+        self.status_map[task] = status
+        self.file.write(f"{task},{status.value}\n")
+        self.file.flush()
+
+    def get_status(self, task: str) -> QueryStatus:
+        return self.status_map.get(task, QueryStatus.NOTQUERIED)
+
+    def close(self) -> None:
+        self.file.close()
@@ -1,37 +1,64 @@
-from typing import List, Optional, Union, Type
+from typing import Dict, List, Optional, Sequence, Tuple, Union, Type
+import hashlib
 from pathlib import Path
 import pandas as pd
-from pandas import DataFrame
+from pandas import DataFrame, Series
 import numpy as np
-import alphalens as al
 from datetime import datetime
-from tqdm import tqdm
 
 from datahandler.handler import DataHandler
-from object import BarDataCache
+from datahandler.database.bar_store import BarStore
+from object import BarDataCache, BarPanel
+from matrix_cache import MatrixCache
 from constant import Market
 from setting import SETTINGS
 from factor.factors import FactorTemplate
-from utilities import summary_ic_data, plot_return
+from factor.factor_store import FactorStore
+from factor.intermediates import IntermediateRegistry, register_default_intermediates
+from factor.parallel import calculate_factors_parallel
+from factor.expression import calculate_expression_factors
+from factor.chunked import calculate_factors_chunked
+from analysis.factor_data import ForwardReturnEngine
+from analysis.report import ReportRunner
+from log.logger import Logger
+
+
+# 面板中包含的bar字段
+panel_fields: List[str] = ["open_price", "high_price", "low_price", "close_price", "volume", "turnover"]
 
 
 class Environment:
     def __init__(self, market: str) -> None:
         self.market: Market = Market(market)
-        self.data_handler: DataHandler = DataHandler(market)
+        self._data_handler: Optional[DataHandler] = None
+        self.logger = Logger("Environment")
 
         # 待分析因子
         self.factors: List[FactorTemplate] = []
 
+        # 因子值缓存；为None时每次重新计算
+        self.factor_store: Optional[FactorStore] = None
+
         # 数据缓存
         self.bar_data_cache: Optional[BarDataCache] = None
-        self.close_df_cache: Optional[DataFrame] = None
-        self.open_df_cache: Optional[DataFrame] = None
-        self.high_df_cache: Optional[DataFrame] = None
-        self.low_df_cache: Optional[DataFrame] = None
+        self.bar_panel: Optional[BarPanel] = None
+
+        # 派生矩阵缓存，按字节预算LRU淘汰
+        self.matrix_cache: MatrixCache = MatrixCache(SETTINGS["cache.budget_bytes"])
 
-        self.volume_df_cache: Optional[DataFrame] = None
-        self.log_return_cache: Optional[DataFrame] = None
+        # 因子共享的中间量，如平移、收益率、滚动统计量
+        self.intermediates: IntermediateRegistry = IntermediateRegistry(self.matrix_cache)
+        register_default_intermediates(self.intermediates, self)
+
+        # 因子分析所用的远期收益率，按periods缓存，由所有因子共享
+        self.forward_return_engines: Dict[Tuple[int, ...], ForwardReturnEngine] = {}
+
+    @property
+    def data_handler(self) -> DataHandler:
+        """仅在从数据库加载数据时才创建DataHandler"""
+        if self._data_handler is None:
+            self._data_handler = DataHandler(self.market.value)
+        return self._data_handler
 
     def load_bar_data_from_csv(
             self,
@@ -72,105 +99,413 @@ class Environment:
 
         cache: BarDataCache = BarDataCache(self.market, start, end, symbols_num, bar_df)
 
-        self.bar_data_cache = cache
+        self.set_bar_data_cache(cache)
 
         self.describe_bar_data_cache()
 
-    def load_bar_data_from_database(self, symbols: Union[str, List[str]], interval: str, start: str, end: str) -> None:
+    def load_bar_data_from_store(
+            self,
+            path: Optional[Union[str, Path]] = None,
+            interval: str = "d",
+            symbols: Optional[Union[str, List[str]]] = None,
+            start: Optional[str] = None,
+            end: Optional[str] = None,
+            fields: Optional[List[str]] = None
+    ) -> None:
+        """
+        从本地列式bar数据仓库加载数据；仅读取fields中的字段，并按symbols、start、end过滤分区
+        时间需为形如“20240101”的格式
+        """
+        if path is None:
+            path = Path(SETTINGS["project.abs_path"]).joinpath(SETTINGS["bar_store.direction"])
+
+        bar_df: DataFrame = BarStore(path).load_bar_data(interval, symbols, start, end, fields)
+        if bar_df.empty:
+            self.logger.warning("bar数据仓库中没有满足条件的数据")
+            return
+
+        start: str = bar_df["datetime"].min().strftime("%Y-%m-%d %H:%M:%S")
+        end: str = bar_df["datetime"].max().strftime("%Y-%m-%d %H:%M:%S")
+        symbols_num: int = len(bar_df["symbol"].unique())
+
+        cache: BarDataCache = BarDataCache(self.market, start, end, symbols_num, bar_df)
+
+        self.set_bar_data_cache(cache)
+
+        self.describe_bar_data_cache()
+
+    def save_bar_data_to_store(self, path: Optional[Union[str, Path]] = None) -> None:
+        """将已加载的bar数据写入本地列式bar数据仓库，便于之后快速加载"""
+        if self.bar_data_cache is None:
+            print("请先加载bar数据")
+            return
+
+        if self.bar_data_cache.dataframe is None:
+            raise ValueError("长表bar数据已释放，无法写入bar数据仓库；请重新加载数据，或关闭cache.drop_bar_dataframe后再构建面板")
+
+        if path is None:
+            path = Path(SETTINGS["project.abs_path"]).joinpath(SETTINGS["bar_store.direction"])
+
+        BarStore(path).save_bar_data(self.bar_data_cache.dataframe)
+
+    def load_bar_data_from_database(
+            self,
+            symbols: Union[str, List[str]],
+            interval: str,
+            start: str,
+            end: str,
+            fields: Optional[List[str]] = None
+    ) -> None:
         if type(symbols) is str:
             if symbols == "all":
                 symbols = self.data_handler.get_all_ashare_stock_symbol()
             else:
                 symbols = [symbols]
 
-        bar_df = self.data_handler.get_bar_data_from_database(symbols, interval, start, end)
+        bar_df = self.data_handler.get_bar_data_from_database(symbols, interval, start, end, fields)
         bars_cache = BarDataCache(self.market, start, end, len(symbols), bar_df)
-        self.bar_data_cache = bars_cache
-        self.data_handler.logger.info("a股bar数据加载完成")
+        self.set_bar_data_cache(bars_cache)
+        self.logger.info("a股bar数据加载完成")
 
         self.describe_bar_data_cache()
 
+    def set_bar_data_cache(self, cache: BarDataCache) -> None:
+        """替换bar数据，并清空由旧数据生成的面板与矩阵缓存"""
+        self.bar_data_cache = cache
+        self.bar_panel = None
+        self.matrix_cache.clear()
+        self.intermediates.clear()
+        self.forward_return_engines.clear()
+
     def describe_bar_data_cache(self) -> None:
         cache = self.bar_data_cache
         message = f"市场类型：{self.market.value}  开始时间：{cache.start}  结束时间：{cache.end} symbol数量：{cache.symbols_num}"
-        self.data_handler.logger.info(message)
+        self.logger.info(message)
 
     def get_bar_data_df(self) -> DataFrame:
         if self.bar_data_cache is None:
             print("请先加载bar数据")
             return pd.DataFrame()
 
+        if self.bar_data_cache.dataframe is None:
+            print("长表bar数据已释放")
+            return pd.DataFrame()
+
         return self.bar_data_cache.dataframe
 
+    def get_bar_data_fingerprint(self) -> str:
+        """bar数据内容的哈希值，数据相同则指纹相同；在释放长表数据前计算并保存"""
+        cache = self.bar_data_cache
+        if cache.fingerprint is None:
+            if cache.dataframe is None:
+                raise ValueError("长表bar数据已释放且没有保存数据指纹，请重新加载数据")
+            row_hash = pd.util.hash_pandas_object(cache.dataframe, index=False).to_numpy()
+            cache.fingerprint = hashlib.sha1(row_hash.tobytes()).hexdigest()
+        return cache.fingerprint
+
+    def build_bar_panel(self) -> BarPanel:
+        """
+        一次性将长表bar数据转换为(字段, datetime, symbol)的稠密数组；
+        datetime与symbol只各做一次factorize，各字段按相同的行列位置直接填入
+        """
+        bar_df = self.bar_data_cache.dataframe
+        fields = [field for field in panel_fields if field in bar_df.columns]
+
+        dt_codes, dt_uniques = pd.factorize(bar_df["datetime"], sort=True)
+        symbol_codes, symbol_uniques = pd.factorize(bar_df["symbol"], sort=True)
+
+        # 重复的(datetime, symbol)会被后出现的行静默覆盖
+        cell = dt_codes.astype("int64") * len(symbol_uniques) + symbol_codes
+        duplicated = np.bincount(cell, minlength=len(dt_uniques) * len(symbol_uniques)) > 1
+        if duplicated.any():
+            cells = np.flatnonzero(duplicated)
+            examples = [
+                (str(dt_uniques[c // len(symbol_uniques)]), symbol_uniques[c % len(symbol_uniques)]) for c in cells[:5]
+            ]
+            raise ValueError(f"bar数据中有{len(cells)}组重复的(datetime, symbol)，例如{examples}")
+
+        values = np.full((len(fields), len(dt_uniques), len(symbol_uniques)), np.nan)
+        for i, field in enumerate(fields):
+            values[i, dt_codes, symbol_codes] = bar_df[field].to_numpy(dtype="float64")
+
+        index = pd.DatetimeIndex(pd.to_datetime(dt_uniques)).tz_convert(SETTINGS["timezone"])
+        index.name = "datetime"
+        columns = pd.Index(symbol_uniques, name="symbol")
+
+        self.bar_panel = BarPanel(fields, index, columns, values)
+
+        if SETTINGS["cache.drop_bar_dataframe"]:
+            self.release_bar_dataframe()
+
+        return self.bar_panel
+
+    def release_bar_dataframe(self) -> None:
+        """面板构建完成后释放长表bar数据以节省内存；释放前先计算数据指纹供因子缓存使用"""
+        if self.bar_data_cache is None or self.bar_data_cache.dataframe is None:
+            return
+
+        self.get_bar_data_fingerprint()
+        if self.bar_panel is None:
+            self.build_bar_panel()
+        self.bar_data_cache.dataframe = None
+
+    def get_bar_panel(self) -> BarPanel:
+        if self.bar_panel is None:
+            self.build_bar_panel()
+        return self.bar_panel
+
     def get_matrix_from_bar_data_cache(self, col_name: str) -> DataFrame:
         """
-        输出DataFrame行索引为datetime， 列索引为symbol
+        输出DataFrame行索引为datetime， 列索引为symbol；数据为面板数组的视图，不复制
         """
         if self.bar_data_cache is None:
             print("请先加载bar数据")
             return pd.DataFrame()
 
-        bar_df = self.bar_data_cache.dataframe
-        matrix_df = bar_df.pivot(index="datetime", columns="symbol", values=col_name)
-
-        matrix_df.index = pd.to_datetime(matrix_df.index)
-        matrix_df.index = matrix_df.index.tz_convert(SETTINGS["timezone"])
+        panel = self.get_bar_panel()
+        if col_name not in panel.fields:
+            raise ValueError(f"面板中没有字段{col_name}，现有字段：{panel.fields}")
+        i = panel.fields.index(col_name)
+        matrix_df = pd.DataFrame(panel.values[i], index=panel.index, columns=panel.columns, copy=False)
 
         return matrix_df
 
+    def get_latest_bar(self, col_name: str, lag: int = 0) -> np.ndarray:
+        """面板中某字段倒数第lag+1期的横截面，按symbol排列"""
+        panel = self.get_bar_panel()
+        return panel.values[panel.fields.index(col_name), -1 - lag]
+
+    def append_bar_data(self, bar_df: DataFrame) -> None:
+        """
+        追加一期bar数据（长表，datetime需相同且晚于已有数据）；
+        面板按预留容量原地追加，不在面板中的symbol被忽略；派生矩阵缓存随之清空
+        """
+        panel = self.get_bar_panel()
+        new_dt = pd.DatetimeIndex(pd.to_datetime(bar_df["datetime"], utc=True).unique()).tz_convert(SETTINGS["timezone"])
+        if len(new_dt) != 1:
+            raise ValueError("每次只能追加一期bar数据")
+        if new_dt[0] <= panel.index[-1]:
+            raise ValueError("追加的bar数据需晚于已有数据")
+
+        if bar_df["symbol"].duplicated().any():
+            raise ValueError(f"追加的bar数据中有重复的symbol：{list(bar_df['symbol'][bar_df['symbol'].duplicated()].unique())}")
+
+        symbol_idx = panel.columns.get_indexer(bar_df["symbol"])
+        known = symbol_idx >= 0
+        if not known.all():
+            self.logger.warning(f"忽略面板中不存在的symbol：{list(bar_df['symbol'][~known])}")
+
+        n_fields, n_dates, n_symbols = panel.values.shape
+        buffer = panel.buffer
+        if buffer is None or buffer.shape[1] <= n_dates:
+            capacity = n_dates + max(n_dates // 8, 16)
+            buffer = np.full((n_fields, capacity, n_symbols), np.nan)
+            buffer[:, :n_dates] = panel.values
+            panel.buffer = buffer
+
+        for i, field in enumerate(panel.fields):
+            buffer[i, n_dates, symbol_idx[known]] = bar_df[field].to_numpy(dtype="float64")[known]
+
+        panel.set_values(buffer[:, : n_dates + 1])
+        panel.index = panel.index.append(new_dt)
+        panel.index.name = "datetime"
+
+        # 数据指纹在原指纹基础上叠加新增数据的哈希；原指纹在合并前取得，与长表数据是否已释放无关
+        cache = self.bar_data_cache
+        fingerprint = self.get_bar_data_fingerprint()
+        if cache.dataframe is not None:
+            cache.dataframe = pd.concat([cache.dataframe, bar_df], ignore_index=True)
+        cache.end = pd.to_datetime(bar_df["datetime"]).max().strftime("%Y-%m-%d %H:%M:%S")
+
+        row_hash = pd.util.hash_pandas_object(bar_df, index=False).to_numpy()
+        cache.fingerprint = hashlib.sha1(fingerprint.encode("utf-8") + row_hash.tobytes()).hexdigest()
+
+        self.matrix_cache.clear()
+        self.intermediates.clear()
+        self.forward_return_engines.clear()
+
+    def update_bar_data(self, bar_df: DataFrame) -> DataFrame:
+        """
+        追加一期bar数据，并增量更新所有已加载因子
+        :return: 最新一期标准化后的因子值，行为因子名，列为symbol
+        """
+        for factor in self.factors:
+            factor.prepare_update()
+
+        self.append_bar_data(bar_df)
+
+        rows = {factor.name: factor.update_factor() for factor in self.factors}
+        return DataFrame(rows).T
+
     def get_close(self) -> DataFrame:
-        if self.close_df_cache is None:
-            close_df = self.get_matrix_from_bar_data_cache("close_price")
-            self.close_df_cache = close_df
-        else:
-            close_df = self.close_df_cache
-        return close_df
+        return self.get_matrix_from_bar_data_cache("close_price")
 
     def get_open(self) -> DataFrame:
-        if self.open_df_cache is None:
-            open_df = self.get_matrix_from_bar_data_cache("open_price")
-            self.open_df_cache = open_df
-        else:
-            open_df = self.open_df_cache
-        return open_df
+        return self.get_matrix_from_bar_data_cache("open_price")
 
     def get_high(self) -> DataFrame:
-        if self.high_df_cache is None:
-            high_df = self.get_matrix_from_bar_data_cache("high_price")
-            self.high_df_cache = high_df
-        else:
-            high_df = self.high_df_cache
-        return high_df
+        return self.get_matrix_from_bar_data_cache("high_price")
 
     def get_low(self) -> DataFrame:
-        if self.low_df_cache is None:
-            low_df = self.get_matrix_from_bar_data_cache("low_price")
-            self.low_df_cache = low_df
-        else:
-            low_df = self.low_df_cache
-        return low_df
+        return self.get_matrix_from_bar_data_cache("low_price")
 
     def get_volume(self) -> DataFrame:
-        if self.volume_df_cache is None:
-            volume_df = self.get_matrix_from_bar_data_cache("volume")
-            self.volume_df_cache = volume_df
-        else:
-            volume_df = self.volume_df_cache
-        return volume_df
+        return self.get_matrix_from_bar_data_cache("volume")
 
     def get_log_return(self) -> DataFrame:
-        if self.log_return_cache is None:
-            close_df = self.get_close()
-            log_return = np.log(close_df).diff()
-            self.log_return_cache = log_return
-        else:
-            log_return = self.log_return_cache
-        return log_return
+        return self.get_intermediate("log_return")
+
+    def get_intermediate(self, name: str, *args) -> DataFrame:
+        """
+        获取共享中间量，如get_intermediate("rolling", "sum", 20, "log_return")；
+        可用的中间量见factor.intermediates.register_default_intermediates
+        """
+        return self.intermediates.get(name, *args)
+
+    def get_cache_stats(self) -> dict:
+        """派生矩阵缓存的命中、未命中、淘汰次数及占用字节数"""
+        return self.matrix_cache.get_stats()
 
     def load_factor(self, factor) -> None:
         self.factors.append(factor)
 
-    def factor_analysis(self, report_name: str = "", periods=(1, 5, 10)):
+    def set_factor_store(self, factor_store: Optional[FactorStore]) -> None:
+        self.factor_store = factor_store
+
+    def get_factor_key(self, factor: FactorTemplate) -> str:
+        content = factor.get_fingerprint() + self.get_bar_data_fingerprint()
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def get_factor_matrix(self, factor: FactorTemplate) -> DataFrame:
+        """
+        宽表因子值；未计算的因子经calculate_factors在当前进程中计算：
+        优先从因子缓存读取，有表达式的因子在计算图上求值，结果写入缓存
+        """
+        if factor.factor_df is None:
+            self.calculate_factors(1, [factor])
+
+        return factor.get_factor_matrix()
+
+    def calculate_factors(
+            self,
+            processes: Optional[int] = None,
+            factors: Optional[List[FactorTemplate]] = None
+    ) -> None:
+        """
+        计算已加载因子；先从因子缓存读取，未命中的因子中有表达式的在同一张计算图上批量求值，
+        其余由多进程在共享内存面板上并行计算
+        :param processes: 进程数；None为CPU核数，1时其余因子在当前进程中逐个计算
+        :param factors: 只计算这些因子；None为所有已加载因子
+        """
+        if factors is None:
+            factors = self.factors
+
+        pending: List[FactorTemplate] = []
+        for factor in factors:
+            if factor.factor_df is not None:
+                continue
+
+            if self.factor_store is not None:
+                factor_df = self.factor_store.load_factor(self.get_factor_key(factor), factor.name)
+                if factor_df is not None:
+                    factor.factor_df = factor_df
+                    continue
+
+            pending.append(factor)
+
+        # 有表达式的因子编译进同一张计算图，共享公共子表达式一次求值；其余因子由进程池并行计算
+        expression_factors = [factor for factor in pending if factor.get_expression() is not None]
+        calculate_expression_factors(self, expression_factors)
+        other_factors = [factor for factor in pending if factor.get_expression() is None]
+        if processes == 1:
+            for factor in other_factors:
+                factor.get_factor_matrix()
+        else:
+            calculate_factors_parallel(self, other_factors, processes)
+
+        if self.factor_store is not None:
+            for factor in pending:
+                self.factor_store.save_factor(self.get_factor_key(factor), factor.name, factor.factor_df)
+
+    def calculate_factors_chunked(
+            self,
+            path: Optional[Union[str, Path]] = None,
+            interval: str = "d",
+            start: Optional[str] = None,
+            end: Optional[str] = None,
+            fields: Optional[List[str]] = None,
+            chunk_size: Optional[int] = None,
+            output_dir: Optional[Union[str, Path]] = None,
+            panel_fields: Sequence[str] = ("open_price", "close_price")
+    ) -> None:
+        """
+        全市场数据无法一次载入内存时使用：按symbol分块从bar数据仓库读取并计算所有已加载因子，
+        结果写入output_dir下的memmap文件；完成后各因子的factor_df与panel_fields的面板均由磁盘数组支持，
+        可直接用于横截面分析（factor_analysis以下期开盘价计算远期收益率，需包含open_price）
+        :param chunk_size: 每块的symbol数量；None时使用SETTINGS["chunk.symbols"]
+        :param panel_fields: 拼接为全市场面板的bar字段
+        """
+        project_path = Path(SETTINGS["project.abs_path"])
+        if path is None:
+            path = project_path.joinpath(SETTINGS["bar_store.direction"])
+        if output_dir is None:
+            output_dir = project_path.joinpath(SETTINGS["chunk.direction"])
+
+        specs = [(type(factor), factor.params, factor.transforms) for factor in self.factors]
+        result = calculate_factors_chunked(
+            self.market.value, BarStore(path), specs, Path(output_dir), interval, start, end, fields,
+            panel_fields=panel_fields, chunk_size=chunk_size
+        )
+
+        index, columns = result["index"], result["columns"]
+        if len(index) == 0:
+            self.logger.warning("bar数据仓库中没有满足条件的数据")
+            return
+
+        cache = BarDataCache(
+            self.market,
+            index[0].tz_convert("UTC").strftime("%Y-%m-%d %H:%M:%S"),
+            index[-1].tz_convert("UTC").strftime("%Y-%m-%d %H:%M:%S"),
+            len(columns),
+            None,
+            result["fingerprint"]
+        )
+        self.set_bar_data_cache(cache)
+        self.bar_panel = BarPanel(result["panel_fields"], index, columns, result["panel"])
+
+        for i, factor in enumerate(self.factors):
+            factor.factor_df = DataFrame(result["factors"][i], index=index, columns=columns, copy=False)
+            factor.raw_moments = result["moments"][i]
+            factor.standard_moments = factor.raw_moments
+
+        self.describe_bar_data_cache()
+
+    def get_forward_return_engine(self, periods=(1, 5, 10)) -> ForwardReturnEngine:
+        """各期远期收益率；为防止使用未来信息，以下期开盘价作为成交价格"""
+        key = tuple(sorted(periods))
+        if key not in self.forward_return_engines:
+            next_open = self.get_open().shift(-1)
+            next_open = next_open.iloc[:-1]
+            self.forward_return_engines[key] = ForwardReturnEngine(next_open, key)
+        return self.forward_return_engines[key]
+
+    def get_factor_series(self, factor: FactorTemplate) -> Series:
+        """alphalens所需的长表因子值，仅在分析时由宽表转换"""
+        self.get_factor_matrix(factor)
+        return factor.get_factor_series()
+
+    def factor_analysis(
+            self,
+            report_name: str = "",
+            periods=(1, 5, 10),
+            processes: Optional[int] = None,
+            render: bool = True
+    ):
+        """
+        :param report_name: 报告目录名；沿用已有目录时，因子定义、bar数据与periods均未变化的因子直接跳过
+        :param processes: 大于1时先用多进程并行计算需要分析的因子，并在进程池中画图；统计量在当前进程中逐个因子计算
+        :param render: 为False时只保存统计表格，不画图（用于批量筛选因子）
+        """
         # 导出结果设置
         if report_name == "":
             now = datetime.now().strftime("%Y%m%d_%H%M_%S")
@@ -178,38 +513,11 @@ class Environment:
 
         folder_dir = (Path(SETTINGS["project.abs_path"]).joinpath(SETTINGS["factor.report_direction"])
                       .joinpath(report_name))
-        folder_dir.mkdir(parents=True, exist_ok=True)
-
-        # 下期收益率；防止使用未来信息，采用下期收益率
-        next_open = self.get_open().shift(-1)
-        next_open = next_open.iloc[:-1]
-
-        iters = tqdm(self.factors)
-        for factor in iters:
-            iters.set_description(f"正在分析{factor.name}")
-            factor_ser = factor.get_factor_series()
-            factor_data = al.utils.get_clean_factor_and_forward_returns(factor_ser, next_open, periods=periods)
-
-            # 去除na、inf
-            na_mask = factor_data.isna()
-            factor_data = factor_data[~na_mask.any(axis=1)]
-
-            inf_mask = np.isinf(factor_data)
-            factor_data = factor_data[~inf_mask.any(axis=1)]
-
-            # ic分析
-            ic_data = al.performance.factor_information_coefficient(factor_data)
-            sum_df = summary_ic_data(ic_data)
-            idx = [f"{i}d" for i in periods]
-            sum_df.index = idx
-            sum_df = sum_df.T
-            ic_output_name = f"ic_{factor.name}.csv"
-            sum_df.to_csv(folder_dir.joinpath(ic_output_name))
-
-            # 回报率分析
-            pic_name = f"retrun_{factor.name}"
-            save_path = folder_dir.joinpath(pic_name)
-            plot_return(factor_data, save_pic=True, save_path=save_path)
+        runner = ReportRunner(self, folder_dir, periods, processes, render)
+        runner.run()
+
+        # IC均值与IR的显著性检验
+        runner.run_significance()
 
         # 因子间相关性分析
-        pass
+        runner.run_correlation()
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from factor.rolling import rolling_moments
+from factor.cross_section import zscore, rank, winsorize_mad, group_demean
+
+# 向量化实现与pandas结果的一致性检查，直接运行本文件
+
+
+def check_rolling_moments() -> None:
+    """滚动sum/mean/std与pandas rolling一致，包括窗口长于数据（短历史或分块计算）的情况"""
+    rng = np.random.default_rng(0)
+    for n_rows in (1, 3, 5, 8):
+        matrix = rng.normal(size=(n_rows, 4))
+        matrix[rng.random(matrix.shape) < 0.2] = np.nan
+        matrix[0, 0] = np.inf
+
+        windows = sorted({1, 2, n_rows, n_rows + 1, 7, 2 * n_rows + 1, 60})
+        for min_periods in (None, 1):
+            results = rolling_moments(matrix, windows, min_periods=min_periods)
+            for window in windows:
+                rolling = pd.DataFrame(matrix).rolling(window, min_periods=min_periods)
+                for stat in ("sum", "mean", "std"):
+                    expected = getattr(rolling, stat)().to_numpy()
+                    np.testing.assert_allclose(
+                        results[(stat, window)], expected, rtol=1e-10, atol=1e-12,
+                        err_msg=f"rolling {stat}，数据{n_rows}行，窗口{window}，min_periods={min_periods}"
+                    )
+
+
+def check_cross_section_inf() -> None:
+    """横截面变换把±inf视为缺失：含inf的行与将inf替换为NaN后的pandas结果一致，其余值不受影响"""
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(4, 6))
+    matrix[0, 1] = np.inf
+    matrix[1, 2] = -np.inf
+    matrix[2, 0] = np.nan
+    frame = pd.DataFrame(np.where(np.isfinite(matrix), matrix, np.nan))
+
+    demeaned = frame.sub(frame.mean(axis=1), axis=0)
+    np.testing.assert_allclose(zscore(matrix), demeaned.div(frame.std(axis=1), axis=0).to_numpy(), rtol=1e-12)
+    np.testing.assert_allclose(rank(matrix), frame.rank(axis=1, pct=True).to_numpy(), rtol=1e-12)
+
+    median = frame.median(axis=1)
+    mad = 1.4826 * frame.sub(median, axis=0).abs().median(axis=1)
+    expected = frame.clip(median - 5 * mad, median + 5 * mad, axis=0).to_numpy()
+    np.testing.assert_allclose(winsorize_mad(matrix), expected, rtol=1e-12)
+
+    groups = np.array([0, 0, 1, 1, 1, -1])
+    group_mean = frame.T.groupby(groups).transform("mean").T.to_numpy()
+    expected = np.where(groups >= 0, frame.to_numpy() - group_mean, np.nan)
+    np.testing.assert_allclose(group_demean(matrix, groups), expected, rtol=1e-12)
+
+
+def check_forward_returns() -> None:
+    """
+    远期收益率的z值过滤与alphalens.utils.compute_forward_returns一致（因子日期层级为全部日期）；
+    因子日期层级被裁剪时alphalens只在保留的日期上计算均值与标准差，结果不同（见ForwardReturnEngine）
+    """
+    import alphalens as al
+    from analysis.factor_data import ForwardReturnEngine
+
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range("2020-01-01", periods=120)
+    columns = [f"s{i}" for i in range(5)]
+    prices = pd.DataFrame(np.exp(np.cumsum(rng.normal(0, 0.02, (120, 5)), axis=0)), index, columns)
+    prices.iloc[60, 1] *= 1.5
+    prices.iloc[10, 2] *= 0.7
+    engine = ForwardReturnEngine(prices, (1, 5), filter_zscore=3)
+    factor = pd.DataFrame(rng.normal(size=(120, 5)), index, columns).stack()
+
+    expected = al.utils.compute_forward_returns(factor, prices, (1, 5), filter_zscore=3)
+    for label in engine.labels:
+        np.testing.assert_array_equal(
+            engine.returns[label], expected[label].unstack().reindex(index=index, columns=columns).to_numpy()
+        )
+
+    trimmed = factor.loc[index[50]:]
+    trimmed.index = trimmed.index.remove_unused_levels()
+    expected = al.utils.compute_forward_returns(trimmed, prices, (1, 5), filter_zscore=3)
+    filtered = expected["1D"].unstack().reindex(index=index[50:], columns=columns).isna().to_numpy()
+    assert not np.array_equal(filtered, np.isnan(engine.returns["1D"][50:]))
+
+
+if __name__ == "__main__":
+    check_rolling_moments()
+    check_cross_section_inf()
+    check_forward_returns()
+    print("一致性检查通过")
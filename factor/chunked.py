@@ -0,0 +1,172 @@
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+import numpy as np
+from pandas import DataFrame, DatetimeIndex, Index
+
+from datahandler.database.bar_store import BarStore
+from object import BarDataCache, BarPanel
+from setting import SETTINGS
+from factor.expression import FactorGraph
+from factor.cross_section import apply_transforms
+from factor.streaming import get_moments, combine_moments
+
+
+# 因子规格：(因子类, 构造参数, 横截面变换)
+FactorSpec = Tuple[Type, Dict[str, Any], List[Tuple[str, Dict[str, Any]]]]
+
+
+def _build_chunk_environment(market: str, bar_df: DataFrame, index: DatetimeIndex):
+    """由一个symbol分块的bar数据构建只含面板的Environment；面板行按全市场的时间轴对齐"""
+    from environment import Environment
+
+    environment = Environment(market)
+    environment.set_bar_data_cache(
+        BarDataCache(environment.market, "", "", bar_df["symbol"].nunique(), bar_df)
+    )
+    panel = environment.build_bar_panel()
+    environment.release_bar_dataframe()
+
+    if not panel.index.equals(index):
+        values = np.full((len(panel.fields), len(index), len(panel.columns)), np.nan)
+        values[:, index.get_indexer(panel.index)] = panel.values
+        environment.bar_panel = BarPanel(panel.fields, index, panel.columns, values)
+
+    return environment
+
+
+def _calculate_chunk(environment, specs: Sequence[FactorSpec]) -> List[np.ndarray]:
+    """计算一个分块上各因子未标准化的值；有表达式的因子在同一张计算图上求值"""
+    panel: BarPanel = environment.get_bar_panel()
+    factors = [factor_class(environment, **params) for factor_class, params, _ in specs]
+
+    graph = FactorGraph()
+    for i, factor in enumerate(factors):
+        if factor.get_expression() is not None:
+            graph.add_expression(str(i), factor.get_expression())
+    results = graph.evaluate(panel)
+
+    values = []
+    for i, factor in enumerate(factors):
+        if str(i) in results:
+            values.append(results[str(i)])
+        else:
+            factor.calculate_factor()
+            values.append(factor.factor_df.reindex(index=panel.index, columns=panel.columns).to_numpy())
+    return values
+
+
+def _standardize(
+        values: np.ndarray,
+        transforms: List[Tuple[str, Dict[str, Any]]],
+        columns: Index,
+        block_rows: int
+) -> Tuple[int, float, float]:
+    """
+    对磁盘上的因子值按行块原地标准化；未设置横截面变换时为全样本z值标准化（先按行块累计统计量）
+    :return: 未标准化因子值的(个数, 均值, 离差平方和)
+    """
+    n_rows = values.shape[0]
+    moments = (0, 0.0, 0.0)
+    for row in range(0, n_rows, block_rows):
+        moments = combine_moments(moments, get_moments(values[row: row + block_rows]))
+
+    n, mean, m2 = moments
+    std = np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+    for row in range(0, n_rows, block_rows):
+        block = values[row: row + block_rows]
+        if transforms:
+            values[row: row + block_rows] = apply_transforms(block, transforms, columns)
+        else:
+            values[row: row + block_rows] = (block - mean) / std
+
+    return moments
+
+
+def calculate_factors_chunked(
+        market: str,
+        store: BarStore,
+        specs: Sequence[FactorSpec],
+        output_dir: Path,
+        interval: str = "d",
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        panel_fields: Sequence[str] = ("open_price", "close_price"),
+        chunk_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    按symbol分块计算时间序列因子：每次只从bar数据仓库读取chunk_size个symbol，
+    计算结果按列写入磁盘上的memmap数组，最后在拼接后的全市场矩阵上按行块做标准化/横截面变换；
+    内存峰值由分块大小决定，与全市场symbol数量无关
+    因子需只依赖单个symbol自身的时间序列（横截面处理应通过横截面变换完成）
+    :param panel_fields: 同时拼接为全市场面板的bar字段，供因子分析使用
+    :return: {"index", "columns", "factors": (因子, datetime, symbol)的memmap, "panel": 面板memmap,
+              "moments": 各因子未标准化值的统计量, "fingerprint": bar数据指纹}
+    """
+    if chunk_size is None:
+        chunk_size = SETTINGS["chunk.symbols"]
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    symbols = store.get_symbols(interval, start, end)
+    index = store.get_datetimes(interval, start, end).tz_convert(SETTINGS["timezone"])
+    index.name = "datetime"
+    columns = Index(symbols, name="symbol")
+    panel_fields = list(panel_fields)
+
+    shape = (len(index), len(columns))
+    factor_values = np.lib.format.open_memmap(
+        output_dir.joinpath("factors.npy"), mode="w+", dtype="float64", shape=(len(specs),) + shape
+    )
+    panel_values = np.lib.format.open_memmap(
+        output_dir.joinpath("panel.npy"), mode="w+", dtype="float64", shape=(len(panel_fields),) + shape
+    )
+    factor_values[:] = np.nan
+    panel_values[:] = np.nan
+
+    if fields is not None:
+        fields = sorted(set(fields) | set(panel_fields))
+
+    chunk_fingerprints = []
+    for chunk_start in range(0, len(symbols), chunk_size):
+        chunk_symbols = symbols[chunk_start: chunk_start + chunk_size]
+        bar_df = store.load_bar_data(interval, chunk_symbols, start, end, fields)
+        if bar_df.empty:
+            continue
+
+        environment = _build_chunk_environment(market, bar_df, index)
+        del bar_df
+        chunk_fingerprints.append(environment.get_bar_data_fingerprint())
+
+        panel = environment.get_bar_panel()
+        missing = [field for field in panel_fields if field not in panel.fields]
+        if missing:
+            raise ValueError(f"bar数据中没有面板所需的字段{missing}，现有字段：{panel.fields}")
+        positions = columns.get_indexer(panel.columns)
+        for i, values in enumerate(_calculate_chunk(environment, specs)):
+            factor_values[i][:, positions] = values
+        for i, field in enumerate(panel_fields):
+            panel_values[i][:, positions] = panel.values[panel.fields.index(field)]
+
+        del environment, panel
+
+    # 按行块标准化，每块的元素个数与一个symbol分块相当
+    block_rows = max(1, chunk_size * len(index) // max(len(columns), 1))
+    moments = [
+        _standardize(factor_values[i], transforms, columns, block_rows)
+        for i, (_, _, transforms) in enumerate(specs)
+    ]
+    factor_values.flush()
+    panel_values.flush()
+
+    fingerprint = hashlib.sha1("".join(chunk_fingerprints).encode("utf-8")).hexdigest()
+    return {
+        "index": index,
+        "columns": columns,
+        "factors": factor_values,
+        "panel_fields": panel_fields,
+        "panel": panel_values,
+        "moments": moments,
+        "fingerprint": fingerprint
+    }
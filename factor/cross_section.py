@@ -0,0 +1,130 @@
+"""
+逐期横截面变换
+输入为行为日期、列为symbol的二维数组，每个变换沿symbol轴对所有日期一次性向量化计算；
+非有限值（NaN、±inf，如分母为0时的inf）视为缺失，不参与统计量计算，在输出中为NaN；
+与factor.streaming.get_moments只使用有限值一致
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from pandas import Index, Series
+
+
+def _finite(matrix: np.ndarray) -> np.ndarray:
+    """±inf替换为NaN；否则一个inf会使整行的均值、标准差为inf或NaN"""
+    matrix = np.asarray(matrix, dtype="float64")
+    return np.where(np.isfinite(matrix), matrix, np.nan)
+
+
+def _row_count(matrix: np.ndarray) -> np.ndarray:
+    return np.isfinite(matrix).sum(axis=1, keepdims=True)
+
+
+def zscore(matrix: np.ndarray) -> np.ndarray:
+    """每期横截面z值标准化（样本标准差）"""
+    matrix = _finite(matrix)
+    count = _row_count(matrix)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(matrix, axis=1, keepdims=True) / count
+        demeaned = matrix - mean
+        std = np.sqrt(np.nansum(demeaned * demeaned, axis=1, keepdims=True) / (count - 1))
+        return demeaned / std
+
+
+def rank(matrix: np.ndarray, pct: bool = True) -> np.ndarray:
+    """
+    每期横截面排名，相同值取平均排名（与pandas rank(method="average")一致）
+    :param pct: 为True时返回百分位排名(0, 1]，否则返回从1开始的排名
+    """
+    matrix = _finite(matrix)
+    n_rows, n_cols = matrix.shape
+    order = np.argsort(matrix, axis=1)     # NaN排在每行末尾；相同值取平均排名，无需稳定排序
+    sorted_values = np.take_along_axis(matrix, order, axis=1)
+    count = _row_count(matrix)
+
+    # 排序后的名次；只对存在相同值的行做平均排名处理：相同值构成一组，组内取首尾名次的均值
+    sorted_rank = np.tile(np.arange(1, n_cols + 1, dtype="float64"), (n_rows, 1))
+    new_group = np.ones((n_rows, n_cols), dtype=bool)
+    new_group[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]     # NaN与任何值都不相等
+    tie_rows = np.flatnonzero(~new_group.all(axis=1))
+    if len(tie_rows):
+        flat_new_group = new_group[tie_rows].ravel()
+        group_id = np.cumsum(flat_new_group) - 1
+        ordinal = sorted_rank[tie_rows].ravel()
+        first = ordinal[flat_new_group]
+        last = ordinal[np.roll(flat_new_group, -1)]
+        sorted_rank[tie_rows] = ((first + last) / 2)[group_id].reshape(len(tie_rows), n_cols)
+    sorted_rank[np.isnan(sorted_values)] = np.nan
+
+    ranks = np.empty_like(sorted_rank)
+    np.put_along_axis(ranks, order, sorted_rank, axis=1)
+    if pct:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ranks = ranks / count
+    return ranks
+
+
+def winsorize_mad(matrix: np.ndarray, n: float = 5.0) -> np.ndarray:
+    """每期横截面MAD去极值：超出中位数±n倍（经1.4826调整的）绝对中位差的值截断至边界"""
+    matrix = _finite(matrix)
+    with np.errstate(invalid="ignore"):
+        median = np.nanmedian(matrix, axis=1, keepdims=True)
+        mad = 1.4826 * np.nanmedian(np.abs(matrix - median), axis=1, keepdims=True)
+        return np.clip(matrix, median - n * mad, median + n * mad)
+
+
+def group_demean(matrix: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+    每期横截面按组去均值（如行业中性化）
+    :param groups: 每个symbol所属组的整数编号，长度与列数相同；负数表示无分组，结果为NaN
+    """
+    matrix = _finite(matrix)
+    n_rows, n_cols = matrix.shape
+    groups = np.asarray(groups, dtype="int64")
+    n_groups = int(groups.max()) + 1 if len(groups) and groups.max() >= 0 else 1
+
+    valid = ~np.isnan(matrix) & (groups >= 0)
+    slots = (np.arange(n_rows)[:, None] * n_groups + np.maximum(groups, 0)).ravel()
+    sums = np.bincount(slots, weights=np.where(valid, matrix, 0).ravel(), minlength=n_rows * n_groups)
+    counts = np.bincount(slots, weights=valid.ravel(), minlength=n_rows * n_groups)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        group_mean = (sums / counts)[slots].reshape(n_rows, n_cols)
+    return np.where(groups >= 0, matrix - group_mean, np.nan)
+
+
+# 可由FactorTemplate选择的变换
+transforms: Dict[str, Callable[..., np.ndarray]] = {
+    "zscore": zscore,
+    "rank": rank,
+    "winsorize_mad": winsorize_mad,
+    "group_demean": group_demean
+}
+
+
+def get_group_codes(groups: Union[Series, Dict[str, Any]], columns: Index) -> np.ndarray:
+    """将symbol到组名的映射按列顺序转换为组编号；不在映射中的symbol编号为-1"""
+    codes, _ = pd.factorize(Series(groups).reindex(columns))
+    return codes
+
+
+def apply_transforms(
+        matrix: np.ndarray,
+        steps: List[Tuple[str, Dict[str, Any]]],
+        columns: Optional[Index] = None
+) -> np.ndarray:
+    """
+    按顺序对矩阵做横截面变换
+    :param steps: [(变换名, 参数)]，如[("winsorize_mad", {"n": 5}), ("group_demean", {"groups": 行业映射}), ("zscore", {})]
+    :param columns: 矩阵的列（symbol）；group_demean的groups为symbol映射时用于对齐
+    """
+    matrix = np.asarray(matrix, dtype="float64")
+    for name, kwargs in steps:
+        if name not in transforms:
+            raise ValueError(f"不支持的横截面变换：{name}")
+
+        kwargs = dict(kwargs)
+        if name == "group_demean" and not isinstance(kwargs["groups"], np.ndarray):
+            kwargs["groups"] = get_group_codes(kwargs["groups"], columns)
+        matrix = transforms[name](matrix, **kwargs)
+    return matrix
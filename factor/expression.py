@@ -0,0 +1,326 @@
+import ast
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from pandas import DataFrame
+
+from object import BarPanel
+from factor.rolling import rolling_moments
+
+
+# 表达式中可直接使用的面板字段
+field_aliases: Dict[str, str] = {
+    "open": "open_price",
+    "high": "high_price",
+    "low": "low_price",
+    "close": "close_price",
+    "volume": "volume",
+    "turnover": "turnover"
+}
+
+# 常用变量，展开为表达式后参与公共子表达式消除；定义与factor.intermediates中的同名中间量一致
+variables: Dict[str, str] = {
+    "log_ret": "log(close) - delay(log(close), 1)",
+    "ret": "ffill(close) / delay(ffill(close), 1) - 1",
+    "overnight_ret": "log(open / delay(close, 1))",
+    "illiq": "abs(log_ret) / volume"
+}
+
+# 函数名: (矩阵参数个数, 整数/常数参数个数)
+functions: Dict[str, Tuple[int, int]] = {
+    "abs": (1, 0),
+    "log": (1, 0),
+    "sqrt": (1, 0),
+    "sign": (1, 0),
+    "ffill": (1, 0),
+    "cumsum": (1, 0),
+    "fillna": (1, 1),
+    "delay": (1, 1),
+    "delta": (1, 1),
+    "ts_sum": (1, 1),
+    "ts_mean": (1, 1),
+    "ts_std": (1, 1),
+    "ts_max": (1, 1),
+    "ts_min": (1, 1),
+    "max": (2, 0),
+    "min": (2, 0)
+}
+
+binary_ops: Dict[type, str] = {
+    ast.Add: "add",
+    ast.Sub: "sub",
+    ast.Mult: "mul",
+    ast.Div: "div",
+    ast.Pow: "pow"
+}
+
+# 交换律成立的运算，子节点排序后再去重
+commutative_ops = {"add", "mul", "max", "min"}
+
+# 由factor.rolling一次性计算的滚动统计量
+moment_ops: Dict[str, str] = {"ts_sum": "sum", "ts_mean": "mean", "ts_std": "std"}
+
+
+def _shift(x: np.ndarray, n: int) -> np.ndarray:
+    out = np.full_like(x, np.nan)
+    if abs(n) >= len(x):
+        return out
+    if n >= 0:
+        out[n:] = x[: len(x) - n]
+    else:
+        out[:n] = x[-n:]
+    return out
+
+
+def _ffill(x: np.ndarray) -> np.ndarray:
+    """与pandas ffill一致，只填充NaN"""
+    rows = np.where(~np.isnan(x), np.arange(len(x))[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return np.take_along_axis(x, rows, axis=0)
+
+
+def _cumsum(x: np.ndarray) -> np.ndarray:
+    """与pandas cumsum一致，跳过NaN且NaN位置保持为NaN"""
+    out = np.nancumsum(x, axis=0)
+    out[np.isnan(x)] = np.nan
+    return out
+
+
+def _rolling_extreme(x: np.ndarray, window: int, func: Callable, fill_value: float) -> np.ndarray:
+    """滚动最大/最小值；与pandas rolling一致，窗口内有效值少于window个时为NaN"""
+    out = np.full_like(x, np.nan)
+    if window > len(x):
+        return out
+
+    view = np.lib.stride_tricks.sliding_window_view(x, window, axis=0)
+    count = np.isfinite(view).sum(axis=-1)
+    value = func(np.where(np.isnan(view), fill_value, view), axis=-1)
+    out[window - 1:] = np.where(count >= window, value, np.nan)
+    return out
+
+
+# 逐元素或沿时间轴的numpy算子：kernel(*矩阵参数, *常数参数)
+kernels: Dict[str, Callable[..., np.ndarray]] = {
+    "neg": np.negative,
+    "add": np.add,
+    "sub": np.subtract,
+    "mul": np.multiply,
+    "div": np.divide,
+    "pow": np.power,
+    "abs": np.abs,
+    "log": np.log,
+    "sqrt": np.sqrt,
+    "sign": np.sign,
+    "max": np.fmax,
+    "min": np.fmin,
+    "ffill": _ffill,
+    "cumsum": _cumsum,
+    "fillna": lambda x, value: np.where(np.isnan(x), value, x),
+    "delay": _shift,
+    "delta": lambda x, n: x - _shift(x, n),
+    "ts_max": lambda x, window: _rolling_extreme(x, window, np.max, -np.inf),
+    "ts_min": lambda x, window: _rolling_extreme(x, window, np.min, np.inf)
+}
+
+
+class FactorGraph:
+    """
+    因子表达式编译得到的计算图
+    每个节点以(算子, *子节点编号, *常数参数)为键，相同的子表达式只保留一个节点（公共子表达式消除），
+    多个因子共享同一张图，在同一份面板上一次求值；
+    节点编号按创建顺序递增，子节点总在父节点之前，按编号顺序求值即为拓扑序
+    """
+
+    def __init__(self) -> None:
+        self.nodes: List[Tuple] = []
+        self.node_ids: Dict[Tuple, int] = {}
+        self.outputs: Dict[str, int] = {}
+
+    def add_node(self, key: Tuple) -> int:
+        op = key[0]
+        if op in commutative_ops:
+            key = (op,) + tuple(sorted(key[1:3])) + key[3:]
+
+        if key not in self.node_ids:
+            self.node_ids[key] = len(self.nodes)
+            self.nodes.append(key)
+        return self.node_ids[key]
+
+    def add_expression(self, name: str, expression: str) -> int:
+        """编译表达式并登记为输出；返回输出节点编号"""
+        node_id = self.compile(expression)
+        self.outputs[name] = node_id
+        return node_id
+
+    def compile(self, expression: str, expanding: Tuple[str, ...] = ()) -> int:
+        try:
+            tree = ast.parse(expression.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"因子表达式语法错误：{expression}") from e
+        return self._visit(tree.body, expanding)
+
+    def _visit(self, node: ast.AST, expanding: Tuple[str, ...]) -> int:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return self.add_node(("const", float(node.value)))
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name in field_aliases:
+                return self.add_node(("field", field_aliases[name]))
+            if name in field_aliases.values():
+                return self.add_node(("field", name))
+            if name in variables:
+                if name in expanding:
+                    raise ValueError(f"变量循环引用：{name}")
+                return self.compile(variables[name], expanding + (name,))
+            raise ValueError(f"未知的变量：{name}")
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._visit(node.operand, expanding)
+            if isinstance(node.op, ast.USub):
+                return self.add_node(("neg", operand))
+            if isinstance(node.op, ast.UAdd):
+                return operand
+
+        if isinstance(node, ast.BinOp) and type(node.op) in binary_ops:
+            left = self._visit(node.left, expanding)
+            right = self._visit(node.right, expanding)
+            return self.add_node((binary_ops[type(node.op)], left, right))
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            func = node.func.id
+            if func not in functions:
+                raise ValueError(f"未知的函数：{func}")
+
+            n_inputs, n_consts = functions[func]
+            if len(node.args) != n_inputs + n_consts:
+                raise ValueError(f"函数{func}需要{n_inputs + n_consts}个参数")
+
+            inputs = tuple(self._visit(arg, expanding) for arg in node.args[:n_inputs])
+            consts = tuple(self._get_const(arg, func) for arg in node.args[n_inputs:])
+            return self.add_node((func,) + inputs + consts)
+
+        raise ValueError(f"不支持的表达式：{ast.dump(node)}")
+
+    @staticmethod
+    def _get_const(node: ast.AST, func: str):
+        value = node
+        sign = 1
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            value, sign = node.operand, -1
+        if not (isinstance(value, ast.Constant) and isinstance(value.value, (int, float))):
+            raise ValueError(f"函数{func}的窗口/常数参数需为数值")
+        return sign * value.value
+
+    def get_n_inputs(self, key: Tuple) -> int:
+        op = key[0]
+        if op in ("const", "field"):
+            return 0
+        if op == "neg":
+            return 1
+        if op in functions:
+            return functions[op][0]
+        return 2
+
+    def evaluate(self, panel: BarPanel, names: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        在面板上对图求值，返回{因子名: (datetime, symbol)数组}
+        中间节点在最后一个使用者求值后即释放；同一输入上的ts_sum/ts_mean/ts_std对所有窗口一次性计算
+        """
+        if names is None:
+            names = list(self.outputs)
+        targets = {self.outputs[name] for name in names}
+
+        # 只计算输出所需的节点，并统计每个节点的使用次数
+        needed = set()
+        stack = list(targets)
+        while stack:
+            node_id = stack.pop()
+            if node_id in needed:
+                continue
+            needed.add(node_id)
+            key = self.nodes[node_id]
+            stack.extend(key[1: 1 + self.get_n_inputs(key)])
+
+        refcount: Dict[int, int] = {node_id: 0 for node_id in needed}
+        moment_groups: Dict[int, List[int]] = {}
+        for node_id in needed:
+            key = self.nodes[node_id]
+            for child in key[1: 1 + self.get_n_inputs(key)]:
+                refcount[child] += 1
+            if key[0] in moment_ops:
+                moment_groups.setdefault(key[1], []).append(node_id)
+
+        values: Dict[int, np.ndarray] = {}
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            for node_id in sorted(needed):
+                if node_id not in values:
+                    values[node_id] = self._evaluate_node(node_id, panel, values, moment_groups)
+
+                key = self.nodes[node_id]
+                for child in key[1: 1 + self.get_n_inputs(key)]:
+                    refcount[child] -= 1
+                    if refcount[child] == 0 and child not in targets:
+                        del values[child]
+
+        results = {}
+        for name in names:
+            value = values[self.outputs[name]]
+            results[name] = np.broadcast_to(value, panel.values.shape[1:]).astype("float64")
+        return results
+
+    def _evaluate_node(
+            self,
+            node_id: int,
+            panel: BarPanel,
+            values: Dict[int, np.ndarray],
+            moment_groups: Dict[int, List[int]]
+    ) -> np.ndarray:
+        key = self.nodes[node_id]
+        op = key[0]
+
+        if op == "const":
+            return np.float64(key[1])
+        if op == "field":
+            return panel.values[panel.fields.index(key[1])]
+
+        n_inputs = self.get_n_inputs(key)
+        inputs = [values[child] for child in key[1: 1 + n_inputs]]
+        consts = key[1 + n_inputs:]
+
+        if op in moment_ops:
+            group = [gid for gid in moment_groups[key[1]] if gid not in values]
+            windows = sorted({int(self.nodes[gid][2]) for gid in group})
+            stats = sorted({moment_ops[self.nodes[gid][0]] for gid in group})
+            base = np.broadcast_to(inputs[0], panel.values.shape[1:])
+            results = rolling_moments(base, windows, stats)
+            for gid in group:
+                if gid != node_id:
+                    values[gid] = results[(moment_ops[self.nodes[gid][0]], int(self.nodes[gid][2]))]
+            return results[(moment_ops[op], int(key[2]))]
+
+        if op in ("delay", "delta", "ts_max", "ts_min"):
+            base = np.broadcast_to(inputs[0], panel.values.shape[1:])
+            return kernels[op](base, int(consts[0]))
+        if op in ("ffill", "cumsum"):
+            return kernels[op](np.broadcast_to(inputs[0], panel.values.shape[1:]))
+
+        return kernels[op](*inputs, *consts)
+
+
+def calculate_expression_factors(environment, factors: List) -> None:
+    """
+    将多个因子的表达式编译进同一张计算图，在面板上一次求值；
+    结果写入各因子的factor_df，并完成标准化
+    """
+    if not factors:
+        return
+
+    panel: BarPanel = environment.get_bar_panel()
+    graph = FactorGraph()
+    for i, factor in enumerate(factors):
+        graph.add_expression(str(i), factor.get_expression())
+
+    results = graph.evaluate(panel)
+    for i, factor in enumerate(factors):
+        factor.factor_df = DataFrame(results[str(i)], index=panel.index, columns=panel.columns)
+        factor.factor_standardization()
@@ -0,0 +1,76 @@
+import asyncio
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional, Union
+import pandas as pd
+from pandas import DataFrame
+
+from setting import SETTINGS
+
+
+class FactorStore(ABC):
+    """
+    因子值缓存；键由因子指纹（代码与参数）和bar数据指纹共同决定，
+    任一变化都会得到新的键，旧的缓存不会被误用
+    """
+
+    @abstractmethod
+    def load_factor(self, factor_key: str, factor_name: str) -> Optional[DataFrame]:
+        """返回行索引为datetime、列索引为symbol的因子宽表；未命中时返回None"""
+        pass
+
+    @abstractmethod
+    def save_factor(self, factor_key: str, factor_name: str, factor_df: DataFrame) -> None:
+        pass
+
+
+class FileFactorStore(FactorStore):
+    """本地文件缓存，每个因子一个pickle文件"""
+
+    def __init__(self, path: Optional[Union[str, Path]] = None) -> None:
+        if path is None:
+            path = Path(SETTINGS["project.abs_path"]).joinpath(SETTINGS["factor.store_direction"])
+        self.path: Path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def get_file_path(self, factor_key: str, factor_name: str) -> Path:
+        return self.path.joinpath(f"{factor_name}-{factor_key}.pkl")
+
+    def load_factor(self, factor_key: str, factor_name: str) -> Optional[DataFrame]:
+        file_path = self.get_file_path(factor_key, factor_name)
+        if not file_path.exists():
+            return None
+        return pd.read_pickle(file_path)
+
+    def save_factor(self, factor_key: str, factor_name: str, factor_df: DataFrame) -> None:
+        file_path = self.get_file_path(factor_key, factor_name)
+        tmp_path = file_path.with_suffix(".tmp")
+        factor_df.to_pickle(tmp_path)
+        tmp_path.replace(file_path)
+
+
+class MysqlFactorStore(FactorStore):
+    """基于DbFactorData表的缓存"""
+
+    def __init__(self, market: str, interval: str = "d") -> None:
+        from datahandler.database.mysql_database import MysqlDatabase
+
+        self.database = MysqlDatabase(market)
+        self.interval: str = interval
+
+    def run(self, coro):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro)
+
+    def load_factor(self, factor_key: str, factor_name: str) -> Optional[DataFrame]:
+        data_df = self.run(self.database.query_factor_data(factor_key))
+        if data_df.empty:
+            return None
+
+        data_df["datetime"] = data_df["datetime"].dt.tz_convert(SETTINGS["timezone"])
+        factor_df = data_df.pivot(index="datetime", columns="symbol", values="factor_value")
+        return factor_df
+
+    def save_factor(self, factor_key: str, factor_name: str, factor_df: DataFrame) -> None:
+        factor_series = factor_df.stack().dropna()
+        self.run(self.database.save_factor_data(factor_key, factor_name, self.interval, factor_series))
@@ -1,34 +1,274 @@
 from abc import ABC
+from functools import lru_cache
+import hashlib
+import importlib
+import inspect
+import json
 
 import numpy as np
-from pandas import Series
-from typing import Optional, TYPE_CHECKING
+import pandas as pd
+from pandas import Series, DataFrame
+from typing import Optional, Callable, Dict, Any, List, Tuple, TYPE_CHECKING
+
+from factor.streaming import RollingState, get_moments, combine_moments
+from factor.expression import FactorGraph
+from factor.cross_section import apply_transforms
+
+
+# 因子值所依赖的模块，以及Environment中为因子提供输入数据的方法；其源代码计入因子指纹，修改后缓存的因子值随之失效
+dependency_modules: Tuple[str, ...] = (
+    "factor.intermediates", "factor.rolling", "factor.expression", "factor.cross_section", "factor.streaming"
+)
+environment_inputs: Tuple[str, ...] = (
+    "build_bar_panel", "get_matrix_from_bar_data_cache", "get_close", "get_open", "get_high", "get_low",
+    "get_volume", "get_log_return", "get_intermediate"
+)
+
+
+@lru_cache(maxsize=None)
+def get_dependency_sources(environment_class: type) -> Tuple[str, ...]:
+    """依赖模块及environment_class中输入方法的源代码；每个Environment类只读取一次"""
+    sources = [inspect.getsource(importlib.import_module(name)) for name in dependency_modules]
+    sources += [
+        inspect.getsource(getattr(environment_class, name)) for name in environment_inputs
+        if hasattr(environment_class, name)
+    ]
+    return tuple(sources)
+
+
+def serialize_param(obj: Any) -> Any:
+    """
+    将因子构造参数与横截面变换参数显式转换为可JSON序列化的值，用于生成指纹；
+    支持None、bool、数值、字符串、numpy标量与数组、list、tuple、dict与Series，其他类型报错，
+    以免不同的参数被转换为相同的内容
+    """
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (list, tuple)):
+        return [serialize_param(item) for item in obj]
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind not in "biufU":
+            raise TypeError(f"因子参数中不支持dtype为{obj.dtype}的数组，无法生成指纹")
+        return {"dtype": obj.dtype.str, "values": obj.tolist()}
+    if isinstance(obj, Series):
+        return {"index": serialize_param(obj.index.tolist()), "values": serialize_param(obj.tolist())}
+    if isinstance(obj, dict):
+        keys = [serialize_param(key) for key in obj.keys()]
+        if not all(isinstance(key, (str, int, float, bool)) for key in keys):
+            raise TypeError("因子参数中dict的键须为字符串、数值或bool，无法生成指纹")
+        return {json.dumps(key): serialize_param(value) for key, value in zip(keys, obj.values())}
+    raise TypeError(f"因子参数中不支持的类型{type(obj).__name__}，无法生成指纹")
 
 
 class FactorTemplate(ABC):
 
     name = None
 
+    # 因子族按窗口批量计算时需要预先计算的滚动中间量：(统计量, 中间量键)
+    rolling_inputs: List[Tuple[str, Tuple]] = []
+
+    # 因子的表达式写法（见factor.expression），以构造参数格式化；
+    # 有表达式的因子由Environment.calculate_factors编译进同一张计算图批量求值
+    expression: Optional[str] = None
+
     def __init__(self, environment):
         self.environment = environment
-        self.factor_series: Optional[Series] = None
+        # 因子值以行索引为datetime、列索引为symbol的宽表保存；长表仅在需要时由get_factor_series生成
+        self.factor_df: Optional[DataFrame] = None
+
+        # 构造参数（不含environment）；子类需按构造函数的参数名填写，用于因子缓存的键及重建因子
+        self.params: Dict[str, Any] = {}
+
+        # 逐期横截面变换步骤（见factor.cross_section），如[("winsorize_mad", {"n": 5}), ("zscore", {})]；
+        # 为空时对全样本做z值标准化
+        self.transforms: List[Tuple[str, Dict[str, Any]]] = []
+
+        # 增量更新相关：未标准化因子值的(个数, 均值, 离差平方和)，当前factor_df标准化时所用的统计量，
+        # 以及尚未并入factor_df的新增期(datetime, 未标准化因子值)
+        self.raw_moments: Optional[Tuple[int, float, float]] = None
+        self.standard_moments: Optional[Tuple[int, float, float]] = None
+        self.pending_rows: List[Tuple[pd.Timestamp, np.ndarray]] = []
+        self.stream_ready: bool = False
+
+    def get_fingerprint(self) -> str:
+        """
+        由因子类及其父类的源代码、依赖模块与Environment输入方法的源代码、构造参数生成指纹；
+        代码或参数变化时指纹随之变化
+        """
+        sources = [
+            inspect.getsource(klass) for klass in type(self).__mro__
+            if klass not in (object, ABC)
+        ]
+        sources += get_dependency_sources(type(self.environment))
+        content = json.dumps(
+            {"sources": sources, "params": serialize_param(self.params), "transforms": serialize_param(self.transforms)},
+            sort_keys=True
+        )
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def set_transforms(self, transforms: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """设置横截面变换步骤；已计算的因子值将重新计算"""
+        self.transforms = list(transforms)
+        self.factor_df = None
+        self.pending_rows = []
+        self.stream_ready = False
+
+    @classmethod
+    def create_batch(
+            cls,
+            environment,
+            frequency: str,
+            windows: List[int],
+            make_params: Optional[Callable[[int], Dict[str, Any]]] = None
+    ) -> List["FactorTemplate"]:
+        """
+        创建同一因子族的多个窗口版本
+        有表达式的因子由Environment.calculate_factors在计算图上求值，同一输入的各窗口滚动统计量在图中一次计算，
+        不经过中间量缓存，因此不预先计算；没有表达式的因子所需的滚动中间量对所有窗口一次性计算并写入缓存，
+        各因子计算时直接命中
+        :param make_params: 由窗口生成构造参数（不含environment）；None时因子类的构造函数须为
+                            (environment, frequency, 窗口)，窗口作为第三个参数传入
+        """
+        if make_params is None:
+            parameters = list(inspect.signature(cls.__init__).parameters.values())[2:]
+            if len(parameters) != 2 or any(p.kind not in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY) for p in parameters):
+                raise TypeError(
+                    f"{cls.__name__}的构造函数不是(environment, frequency, 窗口)，请通过make_params指定构造参数"
+                )
+            frequency_name, window_name = parameters[0].name, parameters[1].name
 
-    def calculate_factor(self) -> Series:
-        """计算因子值；未标准化；返回的dataframe为alphalens支持的multiindex series"""
+            def make_params(window: int) -> Dict[str, Any]:
+                return {frequency_name: frequency, window_name: window}
+
+        if cls.expression is None:
+            stats_map: Dict[Tuple, List[str]] = {}
+            for stat, key in cls.rolling_inputs:
+                stats_map.setdefault(key, []).append(stat)
+
+            for key, stats in stats_map.items():
+                environment.intermediates.prefetch_rolling(stats, windows, *key)
+
+        return [cls(environment, **make_params(window)) for window in windows]
+
+    def get_expression(self) -> Optional[str]:
+        if self.expression is None:
+            return None
+        return self.expression.format(**self.params)
+
+    def calculate_factor(self) -> None:
+        """计算因子值；未标准化；结果写入factor_df，行索引为datetime，列索引为symbol"""
         pass
 
     def factor_standardization(self) -> None:
-        """因子z值标准化"""
-        mean = self.factor_series.mean()
-        std = self.factor_series.std()
+        """
+        未设置横截面变换时，做全样本z值标准化，均值与标准差只使用有限值计算；
+        否则按transforms逐期做横截面变换
+        """
+        self.raw_moments = get_moments(self.factor_df.to_numpy())
+        self.standard_moments = self.raw_moments
+
+        if self.transforms:
+            values = apply_transforms(self.factor_df.to_numpy(), self.transforms, self.factor_df.columns)
+            self.factor_df = DataFrame(values, index=self.factor_df.index, columns=self.factor_df.columns)
+            return
+
+        mean, std = self.get_mean_std(self.raw_moments)
+        self.factor_df = (self.factor_df - mean) / std
+
+    def standardize_rows(self, rows: np.ndarray, columns) -> np.ndarray:
+        """按当前统计量或横截面变换标准化新增期的未标准化因子值"""
+        if self.transforms:
+            return apply_transforms(rows, self.transforms, columns)
+
+        mean, std = self.get_mean_std(self.raw_moments)
+        return (rows - mean) / std
+
+    @staticmethod
+    def get_mean_std(moments: Tuple[int, float, float]) -> Tuple[float, float]:
+        n, mean, m2 = moments
+        std = np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+        return mean, std
+
+    def get_factor_matrix(self) -> DataFrame:
+        """标准化后的宽表因子值"""
+        if self.factor_df is None:
+            self.calculate_factor()
+            self.factor_standardization()
+        if self.pending_rows:
+            self.merge_pending_rows()
+        return self.factor_df
+
+    def merge_pending_rows(self) -> None:
+        """
+        将增量更新得到的新增期并入factor_df；全样本标准化时按最新的统计量重新标准化已有的值，
+        横截面变换只作用于各期自身，已有的值不变
+        """
+        factor_df = self.factor_df
+        if not self.transforms:
+            old_mean, old_std = self.get_mean_std(self.standard_moments)
+            mean, std = self.get_mean_std(self.raw_moments)
+            factor_df = factor_df * (old_std / std) + (old_mean - mean) / std
+
+        new_df = DataFrame(
+            self.standardize_rows(np.vstack([row for _, row in self.pending_rows]), factor_df.columns),
+            index=pd.DatetimeIndex([dt for dt, _ in self.pending_rows], name=factor_df.index.name),
+            columns=factor_df.columns
+        )
+        self.factor_df = pd.concat([factor_df, new_df])
+
+        self.standard_moments = self.raw_moments
+        self.pending_rows = []
+
+    def init_stream(self) -> None:
+        """由environment中的历史数据构建增量更新所需的状态；支持增量更新的因子需重写"""
+        pass
+
+    def update_stream(self) -> Optional[np.ndarray]:
+        """
+        environment追加一期bar数据后，由状态计算最新一期未标准化的因子值（按symbol排列）；
+        返回None表示该因子不支持增量更新，将对全部历史重新计算
+        """
+        return None
+
+    def prepare_update(self) -> None:
+        """在environment追加bar数据之前调用"""
+        if self.stream_ready:
+            return
+
+        # 从因子缓存读取的因子值没有未标准化统计量，需重新计算一次
+        if self.raw_moments is None:
+            self.factor_df = None
+        self.get_factor_matrix()
 
-        self.factor_series = (self.factor_series - mean) / std
+        self.init_stream()
+        self.stream_ready = True
+
+    def update_factor(self) -> Series:
+        """
+        environment追加一期bar数据后调用，返回最新一期标准化后的横截面因子值；
+        标准化使用包含新增期在内的全部历史的均值与标准差，与全量计算的结果一致
+        """
+        panel = self.environment.get_bar_panel()
+        raw_row = self.update_stream()
+
+        if raw_row is None:
+            self.factor_df = None
+            self.pending_rows = []
+            self.stream_ready = False
+            return self.get_factor_matrix().iloc[-1]
+
+        self.raw_moments = combine_moments(self.raw_moments, get_moments(raw_row))
+        self.pending_rows.append((panel.index[-1], raw_row))
+
+        standard_row = self.standardize_rows(raw_row[np.newaxis, :], panel.columns)[0]
+        return Series(standard_row, index=panel.columns, name=panel.index[-1])
 
     def get_factor_series(self) -> Series:
-        if self.factor_series is None:
-            self.calculate_factor()
-            self.factor_standardization()
-        return self.factor_series
+        """alphalens支持的multiindex series；每次调用时由宽表转换，不做缓存"""
+        factor_series = self.get_factor_matrix().stack().dropna()
+        return factor_series
 
 
 class MomentumFactor(FactorTemplate):
@@ -37,23 +277,33 @@ class MomentumFactor(FactorTemplate):
     因此计算因子值后，乘以-1
     """
     name = "momentum"
+    rolling_inputs = [("sum", ("log_return",))]
+    expression = "-ts_sum(log_ret, {looking_back})"
 
     def __init__(self, environment, frequency: str, looking_back: int) -> None:
         super().__init__(environment)
         self.freq = frequency
         self.lb_window = looking_back
         self.name = f"{MomentumFactor.name }_{looking_back}{frequency}"
+        self.params = {"frequency": frequency, "looking_back": looking_back}
 
     def calculate_factor(self) -> None:
         """log_return需为行索引为日期，列索引为股票代码"""
 
-        # 计算对数收益率
-        log_return = self.environment.get_log_return()
+        momentum = self.environment.get_intermediate("rolling", "sum", self.lb_window, "log_return")
+
+        self.factor_df = -momentum
+
+    def init_stream(self) -> None:
+        self.prev_close = self.environment.get_latest_bar("close_price")
+        self.rolling_state = RollingState(self.lb_window, self.environment.get_log_return().to_numpy())
 
-        momentum = log_return.rolling(self.lb_window).sum()
-        momentum = momentum.stack()
+    def update_stream(self) -> np.ndarray:
+        close = self.environment.get_latest_bar("close_price")
+        self.rolling_state.push(np.log(close) - np.log(self.prev_close))
+        self.prev_close = close
 
-        self.factor_series = -momentum
+        return -self.rolling_state.get_sum()
 
 
 class Volatility(FactorTemplate):
@@ -62,23 +312,33 @@ class Volatility(FactorTemplate):
     因子ic满足标准，但稳定性不强，没有明显单调性
     """
     name = "volatility"
+    rolling_inputs = [("std", ("log_return",))]
+    expression = "-ts_std(log_ret, {looking_back})"
 
     def __init__(self, environment, frequency: str, looking_back: int) -> None:
         super().__init__(environment)
         self.freq = frequency
         self.lb_window = looking_back
         self.name = f"{Volatility.name}_{looking_back}{frequency}"
+        self.params = {"frequency": frequency, "looking_back": looking_back}
 
     def calculate_factor(self) -> None:
         """log_return需为行索引为日期，列索引为股票代码"""
 
-        # 计算对数收益率
-        log_return = self.environment.get_log_return()
+        volatility = self.environment.get_intermediate("rolling", "std", self.lb_window, "log_return")
 
-        volatility = log_return.rolling(self.lb_window).std()
-        volatility = volatility.stack()
+        self.factor_df = -volatility
 
-        self.factor_series = -volatility
+    def init_stream(self) -> None:
+        self.prev_close = self.environment.get_latest_bar("close_price")
+        self.rolling_state = RollingState(self.lb_window, self.environment.get_log_return().to_numpy())
+
+    def update_stream(self) -> np.ndarray:
+        close = self.environment.get_latest_bar("close_price")
+        self.rolling_state.push(np.log(close) - np.log(self.prev_close))
+        self.prev_close = close
+
+        return -self.rolling_state.get_std()
 
 
 class ROCSpread(FactorTemplate):
@@ -91,6 +351,10 @@ class ROCSpread(FactorTemplate):
     经测试，ic值不满足标准
     """
     name = "ROC"
+    expression = (
+        "-((close - delay(close, {looking_back})) / delay(close, {looking_back}) * 100"
+        " - ts_mean((close - delay(close, {looking_back})) / delay(close, {looking_back}) * 100, {ma_window}))"
+    )
 
     def __init__(self, environment, frequency: str, looking_back: int=12, ma_window: int=6) -> None:
         super().__init__(environment)
@@ -99,12 +363,14 @@ class ROCSpread(FactorTemplate):
         self.lb_days = looking_back  # 基准是多少日前的收盘价
         self.ma_window = ma_window   # ma窗口宽度
         self.name = f"{ROCSpread.name}_{looking_back}n_{ma_window}m"
+        self.params = {"frequency": frequency, "looking_back": looking_back, "ma_window": ma_window}
 
     def calculate_factor(self) -> None:
         """close_df需为行索引为日期，列索引为股票代码"""
         close_df = self.environment.get_close()
+        close_before = self.environment.get_intermediate("shift", "close_price", self.lb_days)
 
-        roc_df = (close_df - close_df.shift(self.lb_days)) / close_df.shift(self.lb_days) * 100
+        roc_df = (close_df - close_before) / close_before * 100
         roc_ma = roc_df.rolling(self.ma_window).mean()
         roc_spread = roc_df - roc_ma
 
@@ -117,9 +383,7 @@ class ROCSpread(FactorTemplate):
         roc_spread *= is_cross
         """   # 上述计算会丢掉过多数据，不满足分析要求，弃用
 
-        roc_spread = roc_spread.stack()
-
-        self.factor_series = -roc_spread
+        self.factor_df = -roc_spread
 
 
 class CVILLIQ(FactorTemplate):
@@ -130,6 +394,8 @@ class CVILLIQ(FactorTemplate):
     """
     name = "CVILLIQ"
     description = "非流动性变异系数"
+    rolling_inputs = [("std", ("illiq",)), ("mean", ("illiq",))]
+    expression = "-(ts_std(illiq, {looking_back}) / ts_mean(illiq, {looking_back}))"
 
     def __init__(self, environment, frequency: str, looking_back: int = 20) -> None:
         super().__init__(environment)
@@ -137,43 +403,69 @@ class CVILLIQ(FactorTemplate):
         self.freq = frequency
         self.lb_window = looking_back  # 基准是多少日前的收盘价
         self.name = f"{CVILLIQ.name}_{looking_back}{frequency}"
+        self.params = {"frequency": frequency, "looking_back": looking_back}
 
     def calculate_factor(self) -> None:
         """log_return, volume_df需为行索引为日期，列索引为股票代码"""
-        log_return = self.environment.get_log_return()
-        abs_return = np.abs(log_return)
-        volume_df = self.environment.get_volume()
+        std = self.environment.get_intermediate("rolling", "std", self.lb_window, "illiq")
+        mean = self.environment.get_intermediate("rolling", "mean", self.lb_window, "illiq")
 
-        illiq_df = abs_return / volume_df
+        cvilliq = std / mean
 
-        std = illiq_df.rolling(self.lb_window).std()
-        mean = illiq_df.rolling(self.lb_window).mean()
+        self.factor_df = -cvilliq
 
-        cvilliq = std / mean
-        cvilliq = cvilliq.stack()
+    def init_stream(self) -> None:
+        self.prev_close = self.environment.get_latest_bar("close_price")
+        self.rolling_state = RollingState(self.lb_window, self.environment.get_intermediate("illiq").to_numpy())
 
-        self.factor_series = -cvilliq
+    def update_stream(self) -> np.ndarray:
+        close = self.environment.get_latest_bar("close_price")
+        volume = self.environment.get_latest_bar("volume")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            illiq = np.abs(np.log(close) - np.log(self.prev_close)) / volume
+            self.rolling_state.push(illiq)
+            cvilliq = self.rolling_state.get_std() / self.rolling_state.get_mean()
+        self.prev_close = close
+
+        return -cvilliq
 
 
 class VPT(FactorTemplate):
     name = "VPT"
     description = "量价趋势因子"
+    expression = "-cumsum(fillna(ret * volume, 0))"
 
     def __init__(self, environment, ) -> None:
         super().__init__(environment)
 
     def calculate_factor(self) -> None:
-        close_df = self.environment.get_close()
-        close_pct_return = close_df.pct_change()
+        close_pct_return = self.environment.get_intermediate("simple_return")
         volume = self.environment.get_volume()
 
         increment = close_pct_return * volume
         increment.iloc[0] = 0
 
         vpt = increment.fillna(0).cumsum()
-        vpt = vpt.stack()
 
-        self.factor_series = -vpt
+        self.factor_df = -vpt
+
+    def init_stream(self) -> None:
+        self.filled_close = self.environment.get_close().ffill().iloc[-1].to_numpy()
+        increment = self.environment.get_intermediate("simple_return") * self.environment.get_volume()
+        increment.iloc[0] = 0
+        self.vpt = increment.fillna(0).cumsum().iloc[-1].to_numpy()
+
+    def update_stream(self) -> np.ndarray:
+        close = self.environment.get_latest_bar("close_price")
+        volume = self.environment.get_latest_bar("volume")
+
+        # 与simple_return一致：先向前填充收盘价再计算收益率
+        filled_close = np.where(np.isnan(close), self.filled_close, close)
+        increment = (filled_close / self.filled_close - 1) * volume
+        self.vpt = self.vpt + np.where(np.isnan(increment), 0, increment)
+        self.filled_close = filled_close
+
+        return -self.vpt
 
 
 class AbsRetNight(FactorTemplate):
@@ -184,22 +476,35 @@ class AbsRetNight(FactorTemplate):
     name = "abs_ret_overnight"
     description = """隔夜跳空因子是隔夜收益率绝对值的累加, 代表过去一段时间内隔夜累计跳空的幅度，
                     与未来收益负相关。隔夜累计跳空幅度越大，未来收益越差"""
+    rolling_inputs = [("sum", ("abs", "overnight_return"))]
+    expression = "-ts_sum(abs(overnight_ret), {lb_window})"
 
     def __init__(self, environment, frequency: str, lb_window: int) -> None:
         super().__init__(environment)
 
         self.lb_window = lb_window
         self.name = f"{AbsRetNight.name}_{lb_window}{frequency}"
+        self.params = {"frequency": frequency, "lb_window": lb_window}
 
     def calculate_factor(self) -> None:
-        open_df = self.environment.get_open()
-        close_yesterday = self.environment.get_close().shift(1)
-        overnight_ret = np.log(open_df / close_yesterday)
-        abs_return = np.abs(overnight_ret)
-        cul_abs_ret = abs_return.rolling(self.lb_window).sum()
-        cul_abs_ret = cul_abs_ret.stack()
+        cul_abs_ret = self.environment.get_intermediate(
+            "rolling", "sum", self.lb_window, "abs", "overnight_return"
+        )
+
+        self.factor_df = -cul_abs_ret
+
+    def init_stream(self) -> None:
+        self.prev_close = self.environment.get_latest_bar("close_price")
+        history = self.environment.get_intermediate("abs", "overnight_return").to_numpy()
+        self.rolling_state = RollingState(self.lb_window, history)
 
-        self.factor_series = -cul_abs_ret
+    def update_stream(self) -> np.ndarray:
+        open_price = self.environment.get_latest_bar("open_price")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.rolling_state.push(np.abs(np.log(open_price / self.prev_close)))
+        self.prev_close = self.environment.get_latest_bar("close_price")
+
+        return -self.rolling_state.get_sum()
 
 
 class WilliamsUpperShadow(FactorTemplate):
@@ -208,23 +513,25 @@ class WilliamsUpperShadow(FactorTemplate):
     """
     name = "william_upper_shadow"
     description = "标准化威廉上影线"
+    rolling_inputs = [("mean", ("spread", "high_price", "close_price"))]
+    expression = "(high - close) / ts_mean(high - close, {lb_window})"
 
     def __init__(self, environment, frequency: str, lb_window: int) -> None:
         super().__init__(environment)
 
         self.lb_window = lb_window
         self.name = f"{WilliamsUpperShadow.name}_{lb_window}{frequency}"
+        self.params = {"frequency": frequency, "lb_window": lb_window}
 
     def calculate_factor(self) -> None:
-        high_df = self.environment.get_high()
-        close_df = self.environment.get_close()
-
-        will_upper = high_df - close_df
+        will_upper = self.environment.get_intermediate("spread", "high_price", "close_price")
+        will_upper_ma = self.environment.get_intermediate(
+            "rolling", "mean", self.lb_window, "spread", "high_price", "close_price"
+        )
 
-        std_will_upper = will_upper / will_upper.rolling(self.lb_window).mean()
-        std_will_upper = std_will_upper.stack()
+        std_will_upper = will_upper / will_upper_ma
 
-        self.factor_series = std_will_upper
+        self.factor_df = std_will_upper
 
 
 class WilliamsLowerShadow(FactorTemplate):
@@ -233,20 +540,47 @@ class WilliamsLowerShadow(FactorTemplate):
     """
     name = "william_lower_shadow"
     description = "标准化威廉下影线"
+    rolling_inputs = [("mean", ("spread", "close_price", "low_price"))]
+    expression = "-((close - low) / ts_mean(close - low, {lb_window}))"
 
     def __init__(self, environment, frequency: str, lb_window: int) -> None:
         super().__init__(environment)
 
         self.lb_window = lb_window
         self.name = f"{WilliamsLowerShadow.name}_{lb_window}{frequency}"
+        self.params = {"frequency": frequency, "lb_window": lb_window}
 
     def calculate_factor(self) -> None:
-        low_df = self.environment.get_low()
-        close_df = self.environment.get_close()
+        will_lower = self.environment.get_intermediate("spread", "close_price", "low_price")
+        will_lower_ma = self.environment.get_intermediate(
+            "rolling", "mean", self.lb_window, "spread", "close_price", "low_price"
+        )
+
+        std_will_lower = will_lower / will_lower_ma
 
-        will_lower = close_df - low_df
+        self.factor_df = -std_will_lower
 
-        std_will_lower = will_lower / will_lower.rolling(self.lb_window).mean()
-        std_will_lower = std_will_lower.stack()
 
-        self.factor_series = -std_will_lower
+class ExpressionFactor(FactorTemplate):
+    """
+    由表达式定义的因子，如ExpressionFactor(env, "reversal_20d", "-ts_sum(log_ret, 20)")；
+    可用的字段、变量与函数见factor.expression
+    """
+
+    def __init__(self, environment, name: str, expression: str) -> None:
+        super().__init__(environment)
+
+        self.name = name
+        self.expression = expression
+        self.params = {"name": name, "expression": expression}
+
+    def get_expression(self) -> str:
+        return self.expression
+
+    def calculate_factor(self) -> None:
+        graph = FactorGraph()
+        graph.add_expression(self.name, self.expression)
+
+        panel = self.environment.get_bar_panel()
+        values = graph.evaluate(panel)[self.name]
+        self.factor_df = DataFrame(values, index=panel.index, columns=panel.columns)
@@ -0,0 +1,118 @@
+from collections import defaultdict
+from typing import Callable, Dict, List, Sequence, Set, Tuple
+import numpy as np
+from pandas import DataFrame
+
+from matrix_cache import MatrixCache
+from factor.rolling import rolling_moments
+
+
+class IntermediateRegistry:
+    """
+    因子计算的共享中间量注册表
+    中间量以(名称, *参数)为键，在同一份面板数据上只计算一次并存入MatrixCache；
+    计算过程中通过get获取的其他中间量会被记录为依赖，失效时级联清除下游中间量
+    """
+
+    def __init__(self, cache: MatrixCache) -> None:
+        self.cache: MatrixCache = cache
+        self.builders: Dict[str, Callable[..., DataFrame]] = {}
+        self.uncached: Set[str] = set()
+
+        self.dependents: Dict[Tuple, Set[Tuple]] = defaultdict(set)
+        self.building: List[Tuple] = []
+
+    def register(self, name: str, builder: Callable[..., DataFrame], cached: bool = True) -> None:
+        """
+        :param builder: builder(registry, *args)，返回行索引为datetime、列索引为symbol的DataFrame
+        :param cached: 为False时每次调用builder，适用于面板视图等无需缓存的中间量
+        """
+        self.builders[name] = builder
+        if not cached:
+            self.uncached.add(name)
+
+    def get(self, name: str, *args) -> DataFrame:
+        key = (name,) + args
+        if self.building:
+            self.dependents[key].add(self.building[-1])
+
+        builder = self.builders[name]
+        if name in self.uncached:
+            return builder(self, *args)
+
+        def _build() -> DataFrame:
+            self.building.append(key)
+            try:
+                return builder(self, *args)
+            finally:
+                self.building.pop()
+
+        return self.cache.get(("intermediate",) + key, _build)
+
+    def prefetch_rolling(self, stats: Sequence[str], windows: Sequence[int], name: str, *args) -> None:
+        """
+        对同一中间量一次性计算多个窗口的滚动统计量并写入缓存，
+        之后get("rolling", stat, window, name, *args)直接命中
+        """
+        base_key = (name,) + args
+        keys = [("rolling", stat, window) + base_key for stat in stats for window in windows]
+        missing = [key for key in keys if ("intermediate",) + key not in self.cache.entries]
+        if not missing:
+            return
+
+        base = self.get(name, *args)
+        results = rolling_moments(base.to_numpy(), sorted({key[2] for key in missing}), sorted({key[1] for key in missing}))
+        for key in missing:
+            self.dependents[base_key].add(key)
+            matrix = DataFrame(results[(key[1], key[2])], index=base.index, columns=base.columns)
+            self.cache.put(("intermediate",) + key, matrix)
+
+    def invalidate(self, name: str, *args) -> None:
+        """清除中间量及所有依赖它的中间量"""
+        key = (name,) + args
+        self.cache.invalidate(("intermediate",) + key)
+        for dependent in self.dependents.pop(key, set()):
+            self.invalidate(*dependent)
+
+    def clear(self) -> None:
+        self.dependents.clear()
+
+
+def register_default_intermediates(registry: IntermediateRegistry, environment) -> None:
+    """
+    field(col)：面板字段
+    shift(col, n)：面板字段平移n期
+    log_return、simple_return：收盘价对数收益率、简单收益率（停牌期间收盘价向前填充）
+    overnight_return：隔夜对数收益率
+    spread(col_a, col_b)：两个面板字段之差
+    illiq：对数收益率绝对值与成交量之比
+    abs(name, *args)：中间量的绝对值
+    rolling(stat, window, name, *args)：中间量的滚动统计量；sum/mean/std使用factor.rolling的累计和算法，
+                                        其余stat使用pandas rolling的同名方法
+    """
+
+    def _simple_return(reg: IntermediateRegistry) -> DataFrame:
+        # 显式向前填充后计算，与pandas 2.x中pct_change()的默认行为一致，且不依赖pandas版本
+        filled_close = reg.get("field", "close_price").ffill()
+        return filled_close / filled_close.shift(1) - 1
+
+    def _rolling(reg: IntermediateRegistry, stat: str, window: int, name: str, *args) -> DataFrame:
+        base = reg.get(name, *args)
+        if stat in ("sum", "mean", "std"):
+            value = rolling_moments(base.to_numpy(), [window], [stat])[(stat, window)]
+            return DataFrame(value, index=base.index, columns=base.columns)
+        return getattr(base.rolling(window), stat)()
+
+    registry.register(
+        "field", lambda reg, col: environment.get_matrix_from_bar_data_cache(col), cached=False
+    )
+    registry.register("shift", lambda reg, col, n: reg.get("field", col).shift(n))
+    registry.register("log_return", lambda reg: np.log(reg.get("field", "close_price")).diff())
+    registry.register("simple_return", _simple_return)
+    registry.register(
+        "overnight_return", lambda reg: np.log(reg.get("field", "open_price") / reg.get("shift", "close_price", 1))
+    )
+    registry.register("spread", lambda reg, col_a, col_b: reg.get("field", col_a) - reg.get("field", col_b))
+    registry.register("illiq", lambda reg: reg.get("abs", "log_return") / reg.get("field", "volume"))
+    registry.register("abs", lambda reg, name, *args: np.abs(reg.get(name, *args)))
+    registry.register("rolling", _rolling)
@@ -4,11 +4,11 @@ import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 env = Environment("ashare")
-env.load_bar_data_from_csv("ashare_bar_data.csv")
+env.load_bar_data_from_store(start="20190101", end="20231231", fields=["close_price", "open_price"])
 
 
-for lb_window in [10, 30, 60, 90]:
-    factor = MomentumFactor(env, "d", lb_window)
+# 同一因子族的多个窗口共用一次滚动计算
+for factor in MomentumFactor.create_batch(env, "d", [10, 30, 60, 90]):
     env.load_factor(factor)
 
 env.factor_analysis("momentum_factor")
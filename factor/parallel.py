@@ -0,0 +1,100 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple, Type
+import numpy as np
+from pandas import DataFrame
+
+from object import BarDataCache, BarPanel
+
+
+# 子进程中的全局状态，由_init_worker设置
+_worker_state: Dict[str, Any] = {}
+
+
+def _create_shared_array(shape: Tuple[int, ...]) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    nbytes = max(int(np.prod(shape)) * 8, 1)
+    shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    arr = np.ndarray(shape, dtype="float64", buffer=shm.buf)
+    return shm, arr
+
+
+def _init_worker(market: str, panel_spec: dict, output_spec: dict) -> None:
+    """子进程初始化：挂载共享内存中的面板与输出数组，并构建只含面板数据的Environment"""
+    from environment import Environment
+
+    panel_shm = shared_memory.SharedMemory(name=panel_spec["shm_name"])
+    output_shm = shared_memory.SharedMemory(name=output_spec["shm_name"])
+    values = np.ndarray(panel_spec["shape"], dtype="float64", buffer=panel_shm.buf)
+    output = np.ndarray(output_spec["shape"], dtype="float64", buffer=output_shm.buf)
+
+    environment = Environment(market)
+    environment.bar_data_cache = BarDataCache(
+        environment.market, panel_spec["start"], panel_spec["end"], len(panel_spec["columns"]), None
+    )
+    environment.bar_panel = BarPanel(panel_spec["fields"], panel_spec["index"], panel_spec["columns"], values)
+
+    _worker_state["shms"] = (panel_shm, output_shm)
+    _worker_state["environment"] = environment
+    _worker_state["output"] = output
+
+
+def _compute_factor(slot: int, factor_class: Type, params: dict, transforms: list) -> int:
+    """在子进程中计算因子，结果直接写入共享输出数组的第slot层，只返回slot"""
+    environment = _worker_state["environment"]
+    factor = factor_class(environment, **params)
+    factor.set_transforms(transforms)
+    factor_df: DataFrame = factor.get_factor_matrix()
+
+    panel = environment.bar_panel
+    factor_df = factor_df.reindex(index=panel.index, columns=panel.columns)
+    _worker_state["output"][slot] = factor_df.to_numpy()
+    return slot
+
+
+def calculate_factors_parallel(environment, factors: List, processes: Optional[int] = None) -> None:
+    """
+    将面板数据放入共享内存，由进程池计算各因子；
+    子进程按(因子类, 构造参数, 横截面变换)重建因子，面板与结果均不经过pickle传递
+    计算结果写入各因子的factor_df
+    """
+    if not factors:
+        return
+
+    panel: BarPanel = environment.get_bar_panel()
+    cache: BarDataCache = environment.bar_data_cache
+
+    panel_shm, shared_values = _create_shared_array(panel.values.shape)
+    output_shape = (len(factors), len(panel.index), len(panel.columns))
+    output_shm, output = _create_shared_array(output_shape)
+
+    try:
+        shared_values[:] = panel.values
+
+        panel_spec = {
+            "shm_name": panel_shm.name,
+            "shape": panel.values.shape,
+            "fields": panel.fields,
+            "index": panel.index,
+            "columns": panel.columns,
+            "start": cache.start,
+            "end": cache.end
+        }
+        output_spec = {"shm_name": output_shm.name, "shape": output_shape}
+
+        with ProcessPoolExecutor(
+                max_workers=processes,
+                initializer=_init_worker,
+                initargs=(environment.market.value, panel_spec, output_spec)
+        ) as executor:
+            futures = [
+                executor.submit(_compute_factor, slot, type(factor), factor.params, factor.transforms)
+                for slot, factor in enumerate(factors)
+            ]
+            for future in as_completed(futures):
+                slot = future.result()
+                factors[slot].factor_df = DataFrame(output[slot].copy(), index=panel.index, columns=panel.columns)
+    finally:
+        del shared_values, output
+        for shm in (panel_shm, output_shm):
+            shm.close()
+            shm.unlink()
@@ -4,7 +4,7 @@ import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 env = Environment("ashare")
-env.load_bar_data_from_csv("ashare_bar_data.csv")
+env.load_bar_data_from_store(start="20190101", end="20231231", fields=["close_price", "open_price"])
 for lb in [6, 12]:
     for ma in [6, 12]:
         factor = ROCSpread(env, "d", lb, ma)
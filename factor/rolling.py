@@ -0,0 +1,66 @@
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+
+
+def rolling_moments(
+        matrix: np.ndarray,
+        windows: Sequence[int],
+        stats: Sequence[str] = ("sum", "mean", "std"),
+        min_periods: Optional[int] = None
+) -> Dict[Tuple[str, int], np.ndarray]:
+    """
+    对行索引为日期、列索引为股票代码的矩阵，一次性计算多个窗口的滚动sum/mean/std
+    只做一次累计和（及平方累计和），每个窗口的结果由两行累计值相减得到；
+    与pandas rolling一致，窗口内有效值个数少于min_periods（默认为窗口长度）时结果为NaN，
+    std为样本标准差（ddof=1）；非有限值（NaN、inf）视为缺失，
+    这与pandas rolling一致（pandas在滚动计算前将±inf替换为NaN），如成交量为0时illiq为inf，两者的结果相同
+    :return: {(stat, window): 与matrix同形状的数组}
+    """
+    matrix = np.asarray(matrix, dtype="float64")
+    n_rows = matrix.shape[0]
+    valid = np.isfinite(matrix)
+
+    # 按列去均值后再累计，减小平方和相减时的精度损失
+    with np.errstate(invalid="ignore"):
+        valid_count = valid.sum(axis=0)
+        center = np.where(valid, matrix, 0).sum(axis=0) / np.maximum(valid_count, 1)
+    centered = np.where(valid, matrix - center, 0)
+
+    def _cumsum(arr: np.ndarray) -> np.ndarray:
+        out = np.zeros((n_rows + 1,) + arr.shape[1:], dtype="float64")
+        np.cumsum(arr, axis=0, out=out[1:])
+        return out
+
+    cum_count = _cumsum(valid.astype("float64"))
+    cum_sum = _cumsum(centered)
+    cum_sq = _cumsum(centered * centered) if "std" in stats else None
+
+    results: Dict[Tuple[str, int], np.ndarray] = {}
+    for window in windows:
+        minp = window if min_periods is None else min_periods
+
+        # 第i行的窗口为累计值第i+1行减去第max(i+1-window, 0)行；窗口长于数据时下界为0，不会越界
+        upper = np.arange(1, n_rows + 1)
+        lower = np.maximum(upper - window, 0)
+        count = cum_count[upper] - cum_count[lower]
+        window_sum = cum_sum[upper] - cum_sum[lower]
+
+        insufficient = count < max(minp, 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            for stat in stats:
+                if stat == "sum":
+                    value = window_sum + count * center
+                elif stat == "mean":
+                    value = window_sum / count + center
+                elif stat == "std":
+                    window_sq = cum_sq[upper] - cum_sq[lower]
+                    var = (window_sq - window_sum * window_sum / count) / (count - 1)
+                    value = np.sqrt(np.maximum(var, 0))
+                    value[count < 2] = np.nan
+                else:
+                    raise ValueError(f"不支持的统计量：{stat}")
+
+                value[insufficient] = np.nan
+                results[(stat, window)] = value
+
+    return results
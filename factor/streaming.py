@@ -0,0 +1,100 @@
+from typing import Tuple
+import numpy as np
+
+
+class RollingState:
+    """
+    逐期更新的滚动窗口状态，每个symbol一列
+    保存窗口内最近window期的原始值（环形缓冲），并维护有效值个数、均值与离差平方和（Welford算法）；
+    与factor.rolling.rolling_moments一致，非有限值视为缺失，有效值不足window个时结果为NaN
+    每当环形缓冲写满一轮时由缓冲区重新精确计算一次，避免增删累积的浮点误差
+    """
+
+    def __init__(self, window: int, history: np.ndarray) -> None:
+        """
+        :param history: 行为日期、列为symbol的历史值，至少使用其最后window行
+        """
+        self.window: int = window
+        n_symbols = history.shape[1]
+
+        self.buffer: np.ndarray = np.full((window, n_symbols), np.nan)
+        tail = history[-window:]
+        self.buffer[window - len(tail):] = tail
+        self.pos: int = 0
+
+        self.count: np.ndarray = np.zeros(n_symbols)
+        self.mean: np.ndarray = np.zeros(n_symbols)
+        self.m2: np.ndarray = np.zeros(n_symbols)
+        self.resync()
+
+    def resync(self) -> None:
+        valid = np.isfinite(self.buffer)
+        values = np.where(valid, self.buffer, 0)
+        self.count = valid.sum(axis=0).astype("float64")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean = np.where(self.count > 0, values.sum(axis=0) / self.count, 0)
+        self.m2 = np.where(valid, (self.buffer - self.mean) ** 2, 0).sum(axis=0)
+
+    def push(self, values: np.ndarray) -> None:
+        old = self.buffer[self.pos]
+
+        # 移出最早一期
+        remove = np.isfinite(old)
+        count = self.count - remove
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = np.where(remove, old - self.mean, 0)
+            mean = np.where(remove & (count > 0), self.mean - delta / count, self.mean)
+        mean = np.where(count > 0, mean, 0)
+        m2 = np.where(remove, self.m2 - delta * (old - mean), self.m2)
+        m2 = np.where(count > 0, m2, 0)
+
+        # 加入最新一期
+        add = np.isfinite(values)
+        count = count + add
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = np.where(add, values - mean, 0)
+            mean = np.where(add, mean + delta / count, mean)
+        m2 = np.where(add, m2 + delta * (values - mean), m2)
+
+        self.count, self.mean, self.m2 = count, mean, m2
+        self.buffer[self.pos] = values
+        self.pos = (self.pos + 1) % self.window
+        if self.pos == 0:
+            self.resync()
+
+    def full(self) -> np.ndarray:
+        return self.count >= self.window
+
+    def get_sum(self) -> np.ndarray:
+        return np.where(self.full(), self.mean * self.count, np.nan)
+
+    def get_mean(self) -> np.ndarray:
+        return np.where(self.full(), self.mean, np.nan)
+
+    def get_std(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(np.maximum(self.m2, 0) / (self.count - 1))
+        return np.where(self.full() & (self.count >= 2), std, np.nan)
+
+
+def get_moments(values: np.ndarray) -> Tuple[int, float, float]:
+    """有限值的(个数, 均值, 离差平方和)"""
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return 0, 0.0, 0.0
+    mean = float(values.mean())
+    return len(values), mean, float(((values - mean) ** 2).sum())
+
+
+def combine_moments(a: Tuple[int, float, float], b: Tuple[int, float, float]) -> Tuple[int, float, float]:
+    """合并两组数据的(个数, 均值, 离差平方和)"""
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
+
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta * delta * n_a * n_b / n
+    return n, mean, m2
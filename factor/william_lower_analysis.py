@@ -4,11 +4,11 @@ import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 env = Environment("ashare")
-env.load_bar_data_from_csv("ashare_bar_data.csv")
+env.load_bar_data_from_store(start="20190101", end="20231231")
 
 
-for lb_window in [5, 20, 30]:
-    factor = WilliamsLowerShadow(env, "d", lb_window)
+# 同一因子族的多个窗口共用一次滚动计算
+for factor in WilliamsLowerShadow.create_batch(env, "d", [5, 20, 30]):
     env.load_factor(factor)
 
 env.factor_analysis("william_lower_shadow")
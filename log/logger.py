@@ -10,7 +10,9 @@ class Logger:
 
         self.formatter = logging.Formatter(SETTINGS["log.format"])
 
-        if SETTINGS["log.console"]:
+        # 同名logger可能被多次创建，避免重复添加控制台输出
+        has_console = any(type(h) is logging.StreamHandler for h in self.logger.handlers)
+        if SETTINGS["log.console"] and not has_console:
             self.console_handler = logging.StreamHandler()
             self.console_handler.setLevel(logging.INFO)
             self.console_handler.setFormatter(self.formatter)
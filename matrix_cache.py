@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+from pandas import DataFrame
+
+
+def read_only(matrix: DataFrame) -> DataFrame:
+    """数据为只读数组的同一矩阵，不复制；缓存的矩阵为多个因子共享，原地修改会报错"""
+    values = matrix.to_numpy()
+    values.setflags(write=False)
+    return DataFrame(values, index=matrix.index, columns=matrix.columns, copy=False)
+
+
+class MatrixCache:
+    """
+    派生矩阵缓存；总字节数超过预算时按LRU淘汰，被淘汰的矩阵在下次使用时重新计算
+    budget_bytes为None时不限制大小
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None) -> None:
+        self.budget_bytes: Optional[int] = budget_bytes
+        self.entries: "OrderedDict[Hashable, DataFrame]" = OrderedDict()
+        self.entry_bytes: Dict[Hashable, int] = {}
+        self.total_bytes: int = 0
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    @staticmethod
+    def get_nbytes(matrix: DataFrame) -> int:
+        return int(matrix.memory_usage(index=True).sum())
+
+    def get(self, key: Hashable, builder: Callable[[], DataFrame]) -> DataFrame:
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        return self.put(key, builder())
+
+    def put(self, key: Hashable, matrix: DataFrame) -> DataFrame:
+        """存入矩阵的只读版本并返回"""
+        self.invalidate(key)
+        matrix = read_only(matrix)
+
+        nbytes = self.get_nbytes(matrix)
+        if self.budget_bytes is not None and nbytes > self.budget_bytes:
+            # 单个矩阵超过预算时不缓存
+            return matrix
+
+        self.entries[key] = matrix
+        self.entry_bytes[key] = nbytes
+        self.total_bytes += nbytes
+
+        while self.budget_bytes is not None and self.total_bytes > self.budget_bytes:
+            old_key = next(iter(self.entries))
+            self.invalidate(old_key)
+            self.evictions += 1
+        return matrix
+
+    def invalidate(self, key: Hashable) -> None:
+        if key in self.entries:
+            del self.entries[key]
+            self.total_bytes -= self.entry_bytes.pop(key)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.entry_bytes.clear()
+        self.total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Optional[int]]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "budget_bytes": self.budget_bytes
+        }
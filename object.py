@@ -1,5 +1,7 @@
 from dataclasses import dataclass
-from pandas import DataFrame
+from typing import Optional, List, Dict
+import numpy as np
+from pandas import DataFrame, DatetimeIndex, Index
 from constant import Market
 
 
@@ -10,3 +12,36 @@ class BarDataCache:
     end: str
     symbols_num: int
     dataframe: DataFrame
+    fingerprint: Optional[str] = None   # bar数据内容的哈希值，首次使用时计算
+
+
+@dataclass
+class BarPanel:
+    """多字段面板数据；values的形状为(字段, datetime, symbol)，为所有因子共享，只读"""
+    fields: List[str]
+    index: DatetimeIndex
+    columns: Index
+    values: np.ndarray
+    buffer: Optional[np.ndarray] = None     # 追加数据时预留容量的底层数组，values为其前若干期的视图
+
+    def __post_init__(self) -> None:
+        self.set_values(self.values)
+
+    def set_values(self, values: np.ndarray) -> None:
+        """替换面板数据并设为只读；由此得到的视图（如get_close的结果）也是只读的，原地修改会报错"""
+        values.setflags(write=False)
+        self.values = values
+
+
+@dataclass
+class FactorData:
+    """
+    宽表形式的因子分析数据，与alphalens中get_clean_factor_and_forward_returns的输出等价；
+    各矩阵的形状均为(datetime, symbol)，mask之外的位置不参与分析
+    """
+    index: DatetimeIndex
+    columns: Index
+    factor: np.ndarray
+    factor_quantile: np.ndarray                 # 分组编号1~quantiles，无效位置为0
+    forward_returns: Dict[str, np.ndarray]      # {"1D": 远期收益率矩阵}
+    mask: np.ndarray
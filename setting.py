@@ -18,7 +18,21 @@ SETTINGS: Dict[str, Any] = {
     
     "timezone": "Asia/Shanghai",
 
-    "factor.report_direction": "factor/report"
+    "download.rate": 0.2,
+    "download.burst": 1,
+    "download.workers": 2,
+    "download.queue_size": 8,
+
+    "factor.report_direction": "factor/report",
+
+    "cache.budget_bytes": 4 * 1024 ** 3,
+    "cache.drop_bar_dataframe": False,
+
+    "bar_store.direction": "data/bar_store",
+    "factor.store_direction": "data/factor_store",
+
+    "chunk.symbols": 500,
+    "chunk.direction": "data/chunk_output"
 }
 
 
@@ -1,3 +1,4 @@
+from typing import Dict
 import pandas as pd
 from scipy import stats
 import matplotlib.pyplot as plt
@@ -5,7 +6,6 @@ import alphalens.performance as perf
 import alphalens.utils as utils
 import alphalens.plotting as plotting
 from alphalens.tears import GridFigure
-import warnings
 
 
 def match_stock_exchange(symbol: str) -> str:
@@ -29,32 +29,31 @@ def match_stock_exchange(symbol: str) -> str:
 
 def summary_ic_data(ic_data) -> pd.DataFrame:
     """
-    根据alphalens.performance.factor_information_coefficient函数的输出结果，生成ic统计表格
+    根据alphalens.performance.factor_information_coefficient函数的输出结果，生成ic统计表格；
+    IC序列按交易日历对齐，没有数据的日期为NaN，各统计量均忽略NaN
     """
     ic_summary_table = pd.DataFrame()
     ic_summary_table["IC Mean"] = ic_data.mean()
     ic_summary_table["IC Std."] = ic_data.std()
     ic_summary_table["Information Ratio"] = \
         ic_data.mean() / ic_data.std()
-    t_stat, p_value = stats.ttest_1samp(ic_data, 0)
+    t_stat, p_value = stats.ttest_1samp(ic_data, 0, nan_policy="omit")
     ic_summary_table["t-stat(IC)"] = t_stat
     ic_summary_table["p-value(IC)"] = p_value
-    ic_summary_table["IC Skew"] = stats.skew(ic_data)
-    ic_summary_table["IC Kurtosis"] = stats.kurtosis(ic_data)
+    ic_summary_table["IC Skew"] = stats.skew(ic_data, nan_policy="omit")
+    ic_summary_table["IC Kurtosis"] = stats.kurtosis(ic_data, nan_policy="omit")
 
     return ic_summary_table
 
 
-@plotting.customize
-def plot_return(
-    factor_data, long_short=True, group_neutral=False, by_group=False, save_pic=False, save_path=None
-):
+def compute_return_stats(factor_data, long_short=True, group_neutral=False) -> Dict[str, pd.DataFrame]:
     """
-    源自alphalens的create_returns_tear_sheet；
-    仅保留画图功能；
-    增加是否保存到本地的参数
+    plot_return所需的统计量，不画图
+    :return: {"factor_returns": 因子加权组合各期收益率,
+              "mean_quant_ret"/"mean_quant_rateret": 各分位组平均收益率（后者换算为单期收益率）,
+              "mean_quant_ret_bydate"/"mean_quant_rateret_bydate": 各分位组逐日平均收益率,
+              "mean_ret_spread_quant"/"std_spread_quant": 最高组与最低组的逐日收益率差及其标准误}
     """
-
     factor_returns = perf.factor_returns(
         factor_data, long_short, group_neutral
     )
@@ -95,29 +94,58 @@ def plot_return(
         std_err=compstd_quant_daily,
     )
 
+    return {
+        "factor_returns": factor_returns,
+        "mean_quant_ret": mean_quant_ret,
+        "mean_quant_rateret": mean_quant_rateret,
+        "mean_quant_ret_bydate": mean_quant_ret_bydate,
+        "mean_quant_rateret_bydate": mean_quant_rateret_bydate,
+        "mean_ret_spread_quant": mean_ret_spread_quant,
+        "std_spread_quant": std_spread_quant,
+    }
+
+
+def summary_return_stats(return_stats: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """
+    将compute_return_stats的结果整理为可保存的表格
+    :return: {"quantile": 各分位组平均收益率, "factor": 因子加权组合逐日收益率,
+              "spread": 最高组与最低组的逐日收益率差及标准误（列名后缀_std）}
+    """
+    spread = pd.concat(
+        [return_stats["mean_ret_spread_quant"], return_stats["std_spread_quant"].add_suffix("_std")], axis=1
+    )
+    return {
+        "quantile": return_stats["mean_quant_rateret"],
+        "factor": return_stats["factor_returns"],
+        "spread": spread,
+    }
+
+
+@plotting.customize
+def render_return(return_stats: Dict[str, pd.DataFrame], long_short=True, group_neutral=False, save_pic=False,
+                  save_path=None):
+    """
+    由compute_return_stats的结果画图；
+    保存到本地时可在非交互式后端（Agg）下运行
+    """
+    factor_returns = return_stats["factor_returns"]
+    mean_quant_ret_bydate = return_stats["mean_quant_ret_bydate"]
+
     fr_cols = len(factor_returns.columns)
     vertical_sections = 2 + fr_cols * 3
     gf = GridFigure(rows=vertical_sections, cols=1)
 
     plotting.plot_quantile_returns_bar(
-        mean_quant_rateret,
+        return_stats["mean_quant_rateret"],
         by_group=False,
         ylim_percentiles=None,
         ax=gf.next_row(),
     )
 
     plotting.plot_quantile_returns_violin(
-        mean_quant_rateret_bydate, ylim_percentiles=(1, 99), ax=gf.next_row()
+        return_stats["mean_quant_rateret_bydate"], ylim_percentiles=(1, 99), ax=gf.next_row()
     )
 
-    trading_calendar = factor_data.index.levels[0].freq
-    if trading_calendar is None:
-        trading_calendar = pd.tseries.offsets.BDay()
-        warnings.warn(
-            "'freq' not set in factor_data index: assuming business day",
-            UserWarning,
-        )
-
     # Compute cumulative returns from daily simple returns, if '1D'
     # returns are provided.
     if "1D" in factor_returns:
@@ -140,8 +168,8 @@ def plot_return(
         gf.next_row() for x in range(fr_cols)
     ]
     plotting.plot_mean_quantile_returns_spread_time_series(
-        mean_ret_spread_quant,
-        std_err=std_spread_quant,
+        return_stats["mean_ret_spread_quant"],
+        std_err=return_stats["std_spread_quant"],
         bandwidth=0.5,
         ax=ax_mean_quantile_returns_spread_ts,
     )
@@ -152,6 +180,20 @@ def plot_return(
         plt.show()
     gf.close()
 
+
+@plotting.customize
+def plot_return(
+    factor_data, long_short=True, group_neutral=False, by_group=False, save_pic=False, save_path=None
+):
+    """
+    源自alphalens的create_returns_tear_sheet；
+    仅保留画图功能；
+    增加是否保存到本地的参数
+    统计量由compute_return_stats计算，画图由render_return完成
+    """
+    return_stats = compute_return_stats(factor_data, long_short, group_neutral)
+    render_return(return_stats, long_short, group_neutral, save_pic, save_path)
+
     if by_group:
         (
             mean_return_quantile_group,